@@ -0,0 +1,160 @@
+import asyncio
+import collections
+import os
+import time
+from contextlib import asynccontextmanager
+
+from inference_scheduler import scheduler
+from metrics import register_collector
+
+# Model-backed requests (/advisor, /advisor/stream, /advisor/scenarios) handled at once by
+# one worker process; 0 turns admission control off. Limits are per process: under
+# serve.py each worker admits its own share.
+MAX_CONCURRENCY = int(os.environ.get("ADVISOR_MAX_CONCURRENCY", "64"))
+
+# Requests allowed to wait for a slot; the next one is shed with a 503
+MAX_QUEUE = int(os.environ.get("ADVISOR_MAX_QUEUE", "256"))
+
+# Time a request may spend queued for a slot plus waiting on goal inference. A request
+# still queued when it runs out is shed; one still waiting on the model is answered
+# from the rules alone. 0 disables the budget.
+LATENCY_BUDGET_MS = float(os.environ.get("ADVISOR_LATENCY_BUDGET_MS", "2000"))
+
+# Retry-After sent with every 503
+RETRY_AFTER_SECONDS = int(os.environ.get("ADVISOR_RETRY_AFTER_SECONDS", "1"))
+
+
+# ----------------- Admission Control ------------------
+# Three tiers under load: admitted requests get the full advice; admitted requests
+# whose goal inference can't happen in time (scheduler saturated, budget spent)
+# get the rule-based sections with a "recommendation unavailable" goal entry;
+# requests that can't even get a slot are shed with 503 + Retry-After.
+class Overloaded(Exception):
+    def __init__(self, reason):
+        super().__init__(f"Server overloaded ({reason}); retry shortly")
+        self.reason = reason
+
+
+class Deadline:
+    def __init__(self, budget):
+        # budget in seconds; None never expires
+        self.expires = None if budget is None else time.perf_counter() + budget
+
+    def remaining(self):
+        return None if self.expires is None else self.expires - time.perf_counter()
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE, budget_ms=LATENCY_BUDGET_MS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.budget = budget_ms / 1000 if budget_ms > 0 else None
+        self.active = 0
+        self.max_active = 0
+        # FIFO of futures; release() hands its slot straight to the oldest live one
+        self._waiters = collections.deque()
+        self.admitted = collections.Counter()
+        self.degraded = collections.Counter()
+        self.shed = collections.Counter()
+
+    @asynccontextmanager
+    async def admit(self, route="/advisor"):
+        # Yields the request's Deadline; raises Overloaded when it is shed
+        deadline = await self.acquire(route)
+        try:
+            yield deadline
+        finally:
+            self.release()
+
+    async def acquire(self, route="/advisor"):
+        # -> Deadline, holding a slot until release(); for slots that outlive one block (streams)
+        deadline = Deadline(self.budget)
+        if self.max_concurrency <= 0:
+            self.admitted[route] += 1
+            return deadline
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                raise self._shed("queue_full")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # A handed-over slot wins over a simultaneous timeout (wait_for returns it)
+                await asyncio.wait_for(waiter, deadline.remaining())
+            except BaseException as e:
+                # Timed out, or the client went away while queued. release() may already have
+                # popped the waiter (and handed it the slot) while wait_for cancelled it.
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                elif waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise self._shed("queue_timeout")
+                raise
+        self.admitted[route] += 1
+        self.max_active = max(self.max_active, self.active)
+        return deadline
+
+    def release(self):
+        if self.max_concurrency <= 0:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _shed(self, reason):
+        self.shed[reason] += 1
+        return Overloaded(reason)
+
+    async def predict(self, rows, deadline):
+        # -> (predictions, None), or (None, reason) when the request should skip the model
+        if not rows:
+            return [], None
+        if scheduler.saturated():
+            reason = "inference_saturated"
+        else:
+            remaining = deadline.remaining()
+            if remaining is None or remaining > 0:
+                try:
+                    return await asyncio.wait_for(scheduler.predict(rows), remaining), None
+                except asyncio.TimeoutError:
+                    pass
+            reason = "budget_exceeded"
+        self.degraded[reason] += 1
+        return None, reason
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "latency_budget_ms": self.budget * 1000 if self.budget is not None else None,
+            "active": self.active,
+            "max_active": self.max_active,
+            "queued": len(self._waiters),
+            "admitted": dict(self.admitted),
+            "degraded": dict(self.degraded),
+            "shed": dict(self.shed),
+        }
+
+
+admission = AdmissionController()
+
+
+@register_collector
+def _admission_metrics():
+    stats = admission.stats()
+    yield "advisor_active_requests", "gauge", "Advisor requests holding an admission slot", [({}, stats["active"])]
+    yield "advisor_queued_requests", "gauge", "Advisor requests waiting for an admission slot", [({}, stats["queued"])]
+    yield "advisor_admitted_total", "counter", "Advisor requests admitted", [
+        ({"route": route}, count) for route, count in stats["admitted"].items()
+    ]
+    yield "advisor_degraded_total", "counter", "Admitted advisor requests answered without the model", [
+        ({"reason": reason}, count) for reason, count in stats["degraded"].items()
+    ]
+    yield "advisor_shed_total", "counter", "Advisor requests rejected with 503", [
+        ({"reason": reason}, count) for reason, count in stats["shed"].items()
+    ]
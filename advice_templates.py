@@ -0,0 +1,135 @@
+# ----------------- Advice Templates ------------------
+# Rules emit {"category", "priority", "template", "params"}; the text response
+# renders each template here, while format=structured returns the template ID
+# and params as-is. Plain strings are str.format-ed with the params; callables
+# get the whole item plus the instrument metadata table.
+#
+# IDs are part of the structured API: add new ones rather than changing the
+# meaning or params of an existing one.
+
+
+def _allocation_lines(rows):
+    return "\n".join(f"• {row['name']}: {row['percent']:.1f}%" for row in rows)
+
+
+def _allocation_concentrated(item, metadata):
+    return (
+        "⚠️ Your investments are highly concentrated.\n"
+        "🔍 Allocation:\n" + _allocation_lines(item["params"]["allocation"]) +
+        "\n💡 Consider diversifying further to manage risk."
+    )
+
+
+def _allocation_balanced(item, metadata):
+    return "✅ Your investment spread looks balanced.\n🔍 Allocation:\n" + _allocation_lines(item["params"]["allocation"])
+
+
+def _asset_class_exposure(item, metadata):
+    params = item["params"]
+    dominant = params["dominant"]
+    return (
+        "📊 Asset Class Exposure:\n" + _allocation_lines(params["classes"]) +
+        f"\n💡 Dominant class: {dominant}. "
+        + ("Consider adding equity instruments for long-term growth." if dominant == "Debt" else "Your asset allocation looks reasonable.")
+    )
+
+
+def _goal_recommendation(item, metadata):
+    params = item["params"]
+    projection = item["projection"]
+    instrument = params["instrument"]
+    info = metadata.get(instrument, {})
+    return (
+        f"📌 Goal: {params['goal']}\n"
+        f"🎯 Recommended Instrument: {instrument}\n"
+        f"🤖 Confidence: {params['confidence']:.1f}%\n"
+        f"💰 Monthly Saving Required: ₹{params['monthly_saving']:,.0f} for {params['years']} years\n"
+        f"📊 Projected Value: ₹{params['projected_value']:,.0f}\n"
+        + (
+            f"🎲 Chance of Reaching Goal: {projection['success_probability']:.0%} "
+            f"(P10 ₹{projection['p10']:,} · P50 ₹{projection['p50']:,} · P90 ₹{projection['p90']:,})\n"
+            if projection is not None else ""  # beyond PROJECTION_MAX_YEARS
+        )
+        + f"📈 Expected Return Rate: {info.get('expected_return', '7% p.a.')}\n"
+        f"🔍 {instrument} Overview:\n"
+        f"• Risk: {info.get('risk', 'N/A')}\n"
+        f"• Lock-in: {info.get('lock_in', 'N/A')}\n"
+        f"• Liquidity: {info.get('liquidity', 'N/A')}\n"
+        f"• Tax Benefits: {info.get('tax_benefits', 'N/A')}"
+    )
+
+
+def _goal_shortfall(item, metadata):
+    params = item["params"]
+    affordable_goals = params["affordable_goals"]
+    if affordable_goals == 1:
+        suggestion = "You can comfortably handle only 1 of your financial goals at this time."
+    elif affordable_goals == 0:
+        suggestion = "Your current income does not support any of your financial goals. Start with emergency savings."
+    else:
+        suggestion = f"You can afford {affordable_goals} goals. Consider prioritizing the most important one."
+    return (
+        f"❗ Your total required savings for all goals is ₹{params['total_required_saving']:,.0f}/month, "
+        f"but your actual monthly savings is only ₹{params['monthly_savings']:,.0f}.\n"
+        f"💡 Suggestion: {suggestion}"
+    )
+
+
+TEMPLATES = {
+    "getting_started": "🔰 You haven't started investing or bought any insurance. Begin by saving at least 10–20% of your income. Then explore simple low-risk investments and basic insurance to protect your finances.",
+    "unstable_income": "⚠️ Your current financial situation is unstable. Consider speaking to a financial advisor before investing.",
+
+    "cash_flow.deficit": "Your expenses exceed your income. Reduce spending or increase earnings to start saving.",
+    "cash_flow.low": "Your savings rate is just {savings_rate:.1f}%. Try to reduce expenses or increase income to save at least 20% of your salary.",
+    "cash_flow.below_target": "Your savings rate is {savings_rate:.1f}%. Consider trimming discretionary expenses to reach a healthier target of 20%.",
+    "cash_flow.good": "Good! Your savings rate is {savings_rate:.1f}%. Keep maintaining or improving this trend.",
+    "cash_flow.excellent": "Excellent! Your savings rate is {savings_rate:.1f}%. You're building wealth at a great pace.",
+
+    "emergency_fund.short": (
+        "Increase your emergency fund to at least ₹{target:,} "
+        "(based on {multiplier:.1f}× monthly salary, adjusted for insurance and dependents)."
+    ),
+    "emergency_fund.ok": "✅ Your emergency fund of ₹{savings:,} meets the recommended {multiplier:.1f}× salary buffer. Great job!",
+
+    "diversification.low": "Consider diversifying your investments into more categories.",
+    "diversification.ok": "Your investments are well-diversified.",
+
+    "allocation.none": "⚠️ You have no investments yet. Start investing a portion of your savings to build long-term wealth.",
+    "allocation.concentrated": _allocation_concentrated,
+    "allocation.balanced": _allocation_balanced,
+    "asset_class_exposure": _asset_class_exposure,
+
+    "goal.target_passed": "Review goal '{goal}' – the target year has passed.",
+    "goal.infeasible": (
+        "📌 Goal: {goal}\n"
+        "❗ Required monthly saving (₹{monthly_saving:,.0f}) is more than your entire income (₹{salary:,}).\n"
+        "💡 This goal is not feasible currently. Consider reducing the goal amount or extending the timeline.\n"
+        "🔄 Based on your current savings, you could aim for a goal of ₹{realistic_goal:,.0f} instead."
+    ),
+    "goal.over_budget": (
+        "📌 Goal: {goal}\n"
+        "❗ Required savings (₹{monthly_saving:,.0f}/month) exceeds your current monthly savings (₹{monthly_savings:,.0f}).\n"
+        "💡 Consider reducing the goal amount or extending the timeline."
+    ),
+    "goal.recommendation": _goal_recommendation,
+    "goal.recommendation_unavailable": (
+        "📌 Goal: {goal}\n"
+        "💰 Monthly Saving Required: ₹{monthly_saving:,.0f} for {years} years\n"
+        "⏳ Instrument recommendation is temporarily unavailable. Please check back shortly."
+    ),
+    "goal.shortfall": _goal_shortfall,
+
+    "health_cover.none": "❌ You do not have health insurance. Please consider buying health coverage to protect your finances from medical emergencies.",
+    "health_cover.low": "Your health insurance (₹{coverage:,}) is below the recommended ₹{recommended:,} for your age ({age}). Consider increasing it.",
+    "term_cover.none": "❌ You lack term life insurance. Consider a plan to protect your family’s income in case of emergencies.",
+    "term_cover.low": "Your term insurance (₹{coverage:,}) is below the recommended ₹{recommended:,} based on your salary ({salary}/month). Consider increasing it.",
+    "retirement_health_cover": "🛡️ Planning for retirement? Ensure your health insurance is ₹500,000 or more to cover rising medical costs.",
+    "large_goal_term_cover": "📌 You have major financial goals like '{goal}'. Consider increasing term life cover beyond ₹{recommended:,}.",
+}
+
+
+def render(item, metadata):
+    template = TEMPLATES[item["template"]]
+    if callable(template):
+        return template(item, metadata)
+    return template.format(**item["params"])
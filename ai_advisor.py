@@ -1,5 +1,12 @@
 import datetime
-from ml_investment_predictor import predict_instrument
+import time
+from collections import defaultdict
+from functools import cached_property
+from advice_templates import render
+from metrics import histogram, stage
+from ml_investment_predictor import predict_instruments_batch
+from portfolio import aggregate_portfolio, allocation_rows
+from projections import build_return_profiles, project_goals
 
 
 
@@ -118,351 +125,547 @@ instrument_metadata = {
     }
 }
 
+# (expected annual return, volatility) per instrument for goal projections
+return_profiles = build_return_profiles(instrument_metadata)
+
 
 
 # ----------------- ADVISOR ENGINE ------------------
-def generate_advice(user, goals, investments, insurance):
+def goal_model_inputs(user, goals, current_year):
+    # Model features for every goal whose target year is still ahead
+    return [
+        {
+            "age": user.age,
+            "salary": user.salary,
+            "savings": user.savings,
+            "risk_profile": "High",
+            "goal": goal.name,
+            "goal_amount": goal.amount,
+            "years_to_goal": goal.target_year - current_year
+        }
+        for goal in goals
+        if goal.target_year - current_year > 0
+    ]
+
+def generate_advice(user, goals, investments, insurance, predictions=None, current_year=None, structured=False,
+                    degraded=False):
+    # user, goals, investments, insurance: domain objects (see domain.py).
+    # predictions: precomputed (instrument, confidence) pairs aligned with goal_model_inputs.
+    # structured=True keeps each item's template ID and params instead of rendering a message.
+    # degraded=True (overload) skips the model: rules that need it run their degraded fallback.
+    facts = AdviceFacts(user, goals, investments, insurance, predictions, current_year)
+    facts.degraded = degraded
     advice = []
+    for rule in RULES:
+        rule.apply(facts, advice)
+    if structured:
+        return advice
+    with stage("render"):
+        return [render_item(item) for item in advice]
+
+
+def advice_item(category, priority, template, **params):
+    return {"category": category, "priority": priority, "template": template, "params": params}
+
 
-    salary = user["salary"]
-    expenses = user.get("expenses", 0)
-    monthly_savings = salary - expenses
-    total_required_saving = 0
-    affordable_goals = 0
-
-    if not investments and not insurance:
-        advice.append({
-            "category": "System Alert",
-            "priority": "High",
-            "message": "🔰 You haven't started investing or bought any insurance. Begin by saving at least 10–20% of your income. Then explore simple low-risk investments and basic insurance to protect your finances."
-            })
-
-    if monthly_savings <= 0:
-        savings_rate = 0
-        priority = "High"
-        msg = "Your expenses exceed your income. Reduce spending or increase earnings to start saving."
+def render_item(item):
+    # The text response: template and params collapse into the rendered message
+    rendered = {"category": item["category"], "priority": item["priority"], "message": render(item, instrument_metadata)}
+    for key, value in item.items():
+        if key not in rendered and key not in ("template", "params"):
+            rendered[key] = value
+    return rendered
+
+
+def referenced_instruments(advice):
+    # Metadata for the instruments structured advice points at, sent once per response
+    names = {str(item["params"]["instrument"]) for item in advice if "instrument" in item["params"]}
+    return {name: instrument_metadata[name] for name in sorted(names) if name in instrument_metadata}
+
+
+# ----------------- SHARED FACTS ------------------
+ASSET_CLASSES = {
+    "Debt": ["Bank FD", "Debt Mutual Fund"],
+    "Equity": ["Equity Mutual Fund", "ELSS Mutual Fund", "Stocks"],
+    "Hybrid": ["PPF", "ULIP", "NPS"],
+    "Alternative": ["Sovereign Gold Bonds", "Real Estate Investment"]
+}
+# instrument -> asset class, so each holding is classified with one lookup
+ASSET_CLASS_OF = {name: category for category, names in ASSET_CLASSES.items() for name in names}
+
+
+class AdviceFacts:
+    # Derived values shared by the rules; each is computed at most once per request
+    def __init__(self, user, goals, investments, insurance, predictions=None, current_year=None):
+        self.user = user
+        self.goals = goals
+        self.investments = investments
+        self.insurance = insurance
+        self._predictions = predictions
+        self.degraded = False
+        self.current_year = datetime.datetime.now().year if current_year is None else current_year
+
+        self.salary = user.salary
+        self.age = user.age
+        self.monthly_savings = self.salary - user.expenses
+
+    @cached_property
+    def savings_rate(self):
+        if self.monthly_savings <= 0:
+            return 0
+        return (self.monthly_savings / self.salary) * 100
+
+    # ---- Insurance ----
+    @cached_property
+    def insurance_types(self):
+        return {ins.type: ins.coverage for ins in self.insurance}
+
+    @cached_property
+    def health_coverage(self):
+        return self.insurance_types.get("Health Insurance", 0)
+
+    @cached_property
+    def recommended_health_cover(self):
+        return 300000 if self.age < 30 else 500000 if self.age <= 45 else 700000
+
+    @cached_property
+    def term_coverage(self):
+        return self.insurance_types.get("Term Life Insurance", 0)
+
+    @cached_property
+    def recommended_term_cover(self):
+        multiplier = 8 if self.salary < 30000 else 10 if self.salary <= 70000 else 12
+        return self.salary * 12 * multiplier
+
+    # ---- Investments ----
+    @cached_property
+    def portfolio(self):
+        # Instrument and asset-class totals from one pass over the holdings (see portfolio.py)
+        return aggregate_portfolio(self.investments, ASSET_CLASS_OF)
+
+    @cached_property
+    def insurance_premiums(self):
+        return sum(ins.amount for ins in self.insurance)
+
+    @cached_property
+    def total_investment(self):
+        # Include both investment and insurance amounts
+        return self.portfolio.invested + self.insurance_premiums
+
+    @cached_property
+    def category_allocation(self):
+        allocation = defaultdict(float, self.portfolio.allocation)
+        # Insurance as a separate category
+        allocation["Insurance"] += self.insurance_premiums
+        return allocation
+
+    @cached_property
+    def class_totals(self):
+        return self.portfolio.class_totals
+
+    # ---- Goals ----
+    @cached_property
+    def goal_plans(self):
+        # (goal, years_left, monthly_saving_needed); years_left <= 0 means the target year has passed
+        plans = []
+        for goal in self.goals:
+            years_left = goal.target_year - self.current_year
+            if years_left <= 0:
+                plans.append((goal, years_left, None))
+            else:
+                remaining_amount = goal.amount - goal.saved_amount
+                plans.append((goal, years_left, remaining_amount / (years_left * 12)))
+        return plans
+
+    @cached_property
+    def active_goal_plans(self):
+        return [plan for plan in self.goal_plans if plan[1] > 0]
+
+    @cached_property
+    def total_required_saving(self):
+        return sum(needed for _, _, needed in self.active_goal_plans)
+
+    @cached_property
+    def affordable_goals(self):
+        return sum(
+            1 for _, _, needed in self.active_goal_plans
+            if needed <= self.salary and needed <= self.monthly_savings
+        )
+
+    @cached_property
+    def predictions(self):
+        # Every active goal is scored in one batched model call
+        if self._predictions is None:
+            return predict_instruments_batch(goal_model_inputs(self.user, self.goals, self.current_year))
+        return self._predictions
+
+    @cached_property
+    def projections(self):
+        # Monte Carlo outcome ranges for every active goal, simulated together
+        plans = self.active_goal_plans
+        return project_goals(
+            return_profiles,
+            instruments=[instrument for instrument, _ in self.predictions],
+            monthly_contribution=[needed for _, _, needed in plans],
+            saved_amount=[goal.saved_amount for goal, _, _ in plans],
+            target_amount=[goal.amount for goal, _, _ in plans],
+            months=[years_left * 12 for _, years_left, _ in plans],
+        )
+
+
+# ----------------- RULES ------------------
+# Rules run in registration order against one shared advice list, so a rule may
+# insert ahead of earlier output (the System Alert and goal shortfall rules do).
+# uses_predictions marks rules that read facts.predictions/projections; streaming
+# defers them until goal inference is done (see AdviceStream), and in degraded
+# mode they run their model-free fallback instead (or nothing, if they have none).
+class Rule:
+    def __init__(self, name, fn, uses_predictions=False, degraded=None):
+        self.name = name
+        self.fn = fn
+        self.uses_predictions = uses_predictions
+        self.degraded = degraded
+
+    def apply(self, facts, advice):
+        fn = self.degraded if facts.degraded and self.uses_predictions else self.fn
+        if fn is None:
+            return
+        started = time.perf_counter()
+        fn(facts, advice)
+        RULE_SECONDS.observe(time.perf_counter() - started, rule=self.name)
+
+
+RULES = []
+RULE_SECONDS = histogram("advisor_rule_seconds", "Time spent in each advice rule", ["rule"])
+
+
+def rule(name, uses_predictions=False, degraded=None):
+    def register(fn):
+        RULES.append(Rule(name, fn, uses_predictions, degraded))
+        return fn
+    return register
+
+
+def rule_stats():
+    summary = RULE_SECONDS.summary()
+    stats = {}
+    for r in RULES:
+        calls, seconds = summary.get((r.name,), (0, 0.0))
+        stats[r.name] = {
+            "calls": calls,
+            "seconds": round(seconds, 6),
+            "avg_us": round(seconds / calls * 1e6, 2) if calls else 0,
+        }
+    return stats
+
+
+@rule("getting_started")
+def _getting_started(facts, advice):
+    if not facts.investments and not facts.insurance:
+        advice.append(advice_item("System Alert", "High", "getting_started"))
+
+
+@rule("cash_flow")
+def _cash_flow(facts, advice):
+    savings_rate = facts.savings_rate
+    if facts.monthly_savings <= 0:
+        priority, template = "High", "cash_flow.deficit"
+    elif savings_rate < 10:
+        priority, template = "High", "cash_flow.low"
+    elif savings_rate < 20:
+        priority, template = "Medium", "cash_flow.below_target"
+    elif savings_rate < 35:
+        priority, template = "Low", "cash_flow.good"
     else:
-        savings_rate = (monthly_savings / salary) * 100
-        if savings_rate < 10:
-            priority = "High"
-            msg = f"Your savings rate is just {savings_rate:.1f}%. Try to reduce expenses or increase income to save at least 20% of your salary."
-        elif savings_rate < 20:
-            priority = "Medium"
-            msg = f"Your savings rate is {savings_rate:.1f}%. Consider trimming discretionary expenses to reach a healthier target of 20%."
-        elif savings_rate < 35:
-            priority = "Low"
-            msg = f"Good! Your savings rate is {savings_rate:.1f}%. Keep maintaining or improving this trend."
-        else:
-            priority = "Low"
-            msg = f"Excellent! Your savings rate is {savings_rate:.1f}%. You're building wealth at a great pace."
+        priority, template = "Low", "cash_flow.excellent"
 
-    advice.append({"category": "Cash Flow", "priority": priority, "message": msg})
+    advice.append(advice_item("Cash Flow", priority, template, savings_rate=savings_rate))
 
-    if salary < 10000:
-        advice.insert(0, {
-            "category": "System Alert",
-            "priority": "High",
-            "message": "⚠️ Your current financial situation is unstable. Consider speaking to a financial advisor before investing."
-        })
-    
-    insurance_types = {ins["type"]: ins["coverage"] for ins in insurance}
-    age = user["age"]
-    annual_salary = salary * 12
 
-    recommended_health_cover = 300000 if age < 30 else 500000 if age <= 45 else 700000
-    health_coverage = insurance_types.get("Health Insurance", 0)
+@rule("unstable_income")
+def _unstable_income(facts, advice):
+    if facts.salary < 10000:
+        advice.insert(0, advice_item("System Alert", "High", "unstable_income"))
 
-    multiplier = 8 if salary < 30000 else 10 if salary <= 70000 else 12
-    recommended_term_cover = annual_salary * multiplier
-    term_coverage = insurance_types.get("Term Life Insurance", 0)
 
-    # ---------------- Emergency Fund Intelligence ---------------- #
+@rule("emergency_fund")
+def _emergency_fund(facts, advice):
+    user = facts.user
     emergency_multiplier = 3  # base recommendation
 
     # Increase multiplier if underinsured
-    if health_coverage < recommended_health_cover:
+    if facts.health_coverage < facts.recommended_health_cover:
         emergency_multiplier += 0.5
-    if term_coverage < recommended_term_cover:
+    if facts.term_coverage < facts.recommended_term_cover:
         emergency_multiplier += 0.5
 
     # Increase if self-employed or has dependents
-    if user.get("job_type", "").lower() == "self-employed":
+    if user.job_type.lower() == "self-employed":
         emergency_multiplier += 1
-    if user.get("dependents", 0) > 0:
+    if user.dependents > 0:
         emergency_multiplier += 0.5
 
-    emergency_target = round(salary * emergency_multiplier)
+    emergency_target = round(facts.salary * emergency_multiplier)
 
-    if user["savings"] < emergency_target:
-        advice.append({
-            "category": "Emergency Fund",
-            "priority": "High",
-            "message": (
-                f"Increase your emergency fund to at least ₹{emergency_target:,} "
-                f"(based on {emergency_multiplier:.1f}× monthly salary, adjusted for insurance and dependents)."
-            )
-        })
+    if user.savings < emergency_target:
+        advice.append(advice_item(
+            "Emergency Fund", "High", "emergency_fund.short",
+            target=emergency_target, multiplier=emergency_multiplier,
+        ))
     else:
-        advice.append({
-            "category": "Emergency Fund",
-            "priority": "Low",
-            "message": (
-                f"✅ Your emergency fund of ₹{user['savings']:,} meets the recommended "
-                f"{emergency_multiplier:.1f}× salary buffer. Great job!"
-            )
-        })
+        advice.append(advice_item(
+            "Emergency Fund", "Low", "emergency_fund.ok",
+            savings=user.savings, multiplier=emergency_multiplier,
+        ))
 
 
-    # Investment Diversification
-    unique_instruments = set(i["instrument_name"] for i in investments)
-    if len(unique_instruments) < 2:
-        advice.append({
-            "category": "Investment",
-            "priority": "Medium",
-            "message": "Consider diversifying your investments into more categories."
-        })
+@rule("diversification")
+def _diversification(facts, advice):
+    if facts.portfolio.instrument_count < 2:
+        advice.append(advice_item("Investment", "Medium", "diversification.low"))
     else:
-        advice.append({
-            "category": "Investment",
-            "priority": "Low",
-            "message": "Your investments are well-diversified."
-        })
+        advice.append(advice_item("Investment", "Low", "diversification.ok"))
 
-    # Investment Allocation Analysis
-    from collections import defaultdict
 
-    
-
-# Exclude Insurance from general investments
-    filtered_investments = [inv for inv in investments if inv["instrument_name"] != "Insurance"]
+@rule("allocation")
+def _allocation(facts, advice):
+    total_investment = facts.total_investment
+    if total_investment == 0:
+        advice.append(advice_item("Investment", "High", "allocation.none"))
+        return
+
+    category_allocation = facts.category_allocation
+    # Judged on every instrument, before long lists are rolled up into "Other"
+    concentrated = (max(category_allocation.values()) / total_investment) * 100 > 70
+    allocation, rolled_up = allocation_rows(category_allocation, total_investment)
+    params = {"allocation": allocation, "rolled_up": rolled_up} if rolled_up else {"allocation": allocation}
+    if concentrated:
+        advice.append(advice_item("Investment", "Medium", "allocation.concentrated", **params))
+    else:
+        advice.append(advice_item("Investment", "Low", "allocation.balanced", **params))
 
-# Include both investment and insurance amounts
-    total_investment = (
-        sum(inv["amount"] for inv in filtered_investments) +
-        sum(ins.get("amount", 0) for ins in insurance)
-    )
 
+@rule("asset_class_exposure")
+def _asset_class_exposure(facts, advice):
+    total_investment = facts.total_investment
     if total_investment == 0:
-        advice.append({
-            "category": "Investment",
-            "priority": "High",
-            "message": "⚠️ You have no investments yet. Start investing a portion of your savings to build long-term wealth."
-        })
-    else:
-    
+        return
 
-        category_allocation = defaultdict(float)
-
-        # Add investment amounts
-        for inv in filtered_investments:
-            category_allocation[inv["instrument_name"]] += inv["amount"]
-
-        # ✅ Add insurance as a separate category
-        category_allocation["Insurance"] += sum(ins.get("amount", 0) for ins in insurance)
-        
-
-        allocation_summary = []
-        over_concentrated = False
-        for name, amt in category_allocation.items():
-            percent = (amt / total_investment) * 100
-            allocation_summary.append(f"• {name}: {percent:.1f}%")
-            if percent > 70:
-                over_concentrated = True
-
-        if over_concentrated:
-            advice.append({
-                "category": "Investment",
-                "priority": "Medium",
-                "message": (
-                    f"⚠️ Your investments are highly concentrated.\n"
-                    f"🔍 Allocation:\n" + "\n".join(allocation_summary) +
-                    "\n💡 Consider diversifying further to manage risk."
-                )
-            })
-        else:
-            advice.append({
-                "category": "Investment",
-                "priority": "Low",
-                "message": (
-                    f"✅ Your investment spread looks balanced.\n"
-                    f"🔍 Allocation:\n" + "\n".join(allocation_summary)
-                )
-            })
-        
-    # Asset Class Exposure Summary
-        asset_classes = {
-            "Debt": ["Bank FD", "Debt Mutual Fund"],
-            "Equity": ["Equity Mutual Fund", "ELSS Mutual Fund", "Stocks"],
-            "Hybrid": ["PPF", "ULIP", "NPS"],
-            "Alternative": ["Sovereign Gold Bonds", "Real Estate Investment"]
-        }
+    class_totals = facts.class_totals
+    classes = [{"name": cat, "percent": (amt / total_investment) * 100} for cat, amt in class_totals.items()]
+    dominant_asset = max(class_totals, key=class_totals.get) if class_totals else "None"
+    advice.append(advice_item(
+        "Investment", "Medium" if dominant_asset == "Debt" else "Low", "asset_class_exposure",
+        classes=classes, dominant=dominant_asset,
+    ))
 
-        class_totals = defaultdict(float)
-        for inv in investments:
-            for category, names in asset_classes.items():
-                if inv["instrument_name"] in names:
-                    class_totals[category] += inv["amount"]
-                    break
-
-        asset_summary = []
-        for cat, amt in class_totals.items():
-            percent = (amt / total_investment) * 100
-            asset_summary.append(f"• {cat}: {percent:.1f}%")
-
-        dominant_asset = max(class_totals, key=class_totals.get) if class_totals else "None"
-        advice.append({
-            "category": "Investment",
-            "priority": "Medium" if dominant_asset == "Debt" else "Low",
-            "message": (
-                f"📊 Asset Class Exposure:\n" + "\n".join(asset_summary) +
-                f"\n💡 Dominant class: {dominant_asset}. "
-                + ("Consider adding equity instruments for long-term growth." if dominant_asset == "Debt" else "Your asset allocation looks reasonable.")
-            )
-        })
 
+# Annual return assumed for a goal's projected value (also used by scenarios.py)
+GOAL_RETURN_RATE = 0.07
 
-    # Goal Planning (ML + Explanation)
-    current_year = datetime.datetime.now().year
-    for goal in goals:
-        years_left = goal["target_year"] - current_year
+
+def _goal_planning_unavailable(facts, advice):
+    # Degraded mode: no instrument, confidence or projection, just a flagged entry per active goal
+    for goal, years_left, monthly_saving_needed in facts.goal_plans:
         if years_left <= 0:
-            advice.append({
-                "category": "Goals",
-                "priority": "High",
-                "message": f"Review goal '{goal['name']}' – the target year has passed."
-            })
+            advice.append(advice_item("Goals", "High", "goal.target_passed", goal=goal.name))
             continue
+        item = advice_item(
+            "Goals", "Medium", "goal.recommendation_unavailable",
+            goal=goal.name, monthly_saving=monthly_saving_needed, years=years_left,
+        )
+        item["recommendation_unavailable"] = True
+        advice.append(item)
 
-        remaining_amount = goal["amount"] - goal.get("saved_amount", 0)
-        monthly_saving_needed = remaining_amount / (years_left * 12)
-        total_required_saving += monthly_saving_needed
 
-        ml_based_instrument, ml_confidence = predict_instrument({
-            "age": user["age"],
-            "salary": user["salary"],
-            "savings": user["savings"],
-            "risk_profile": "High",
-            "goal": goal["name"],
-            "goal_amount": goal["amount"],
-            "years_to_goal": years_left
-        })
+@rule("goal_planning", uses_predictions=True, degraded=_goal_planning_unavailable)
+def _goal_planning(facts, advice):
+    # Goal Planning (ML + Explanation)
+    if not facts.goal_plans:
+        return
+    salary = facts.salary
+    monthly_savings = facts.monthly_savings
+    ml_predictions = iter(facts.predictions)
+    goal_projections = iter(facts.projections)
+
+    for goal, years_left, monthly_saving_needed in facts.goal_plans:
+        if years_left <= 0:
+            advice.append(advice_item("Goals", "High", "goal.target_passed", goal=goal.name))
+            continue
+
+        ml_based_instrument, ml_confidence = next(ml_predictions)
+        projection = next(goal_projections)
 
-        metadata = instrument_metadata.get(ml_based_instrument, {})
-        expected_return_rate = 0.07
+        expected_return_rate = GOAL_RETURN_RATE
         fv = monthly_saving_needed * (((1 + expected_return_rate / 12) ** (years_left * 12) - 1) / (expected_return_rate / 12)) * (1 + expected_return_rate / 12)
 
         if monthly_saving_needed > salary:
-            realistic_goal = (monthly_savings * years_left * 12) + goal.get("saved_amount", 0)
-            msg = (
-                f"📌 Goal: {goal['name']}\n"
-                f"❗ Required monthly saving (₹{monthly_saving_needed:,.0f}) is more than your entire income (₹{salary:,}).\n"
-                f"💡 This goal is not feasible currently. Consider reducing the goal amount or extending the timeline.\n"
-                f"🔄 Based on your current savings, you could aim for a goal of ₹{realistic_goal:,.0f} instead."
+            realistic_goal = (monthly_savings * years_left * 12) + goal.saved_amount
+            item = advice_item(
+                "Goals", "High", "goal.infeasible",
+                goal=goal.name, monthly_saving=monthly_saving_needed, salary=salary, realistic_goal=realistic_goal,
             )
-            priority = "High"
         elif monthly_saving_needed > monthly_savings:
-            msg = (
-                f"📌 Goal: {goal['name']}\n"
-                f"❗ Required savings (₹{monthly_saving_needed:,.0f}/month) exceeds your current monthly savings (₹{monthly_savings:,.0f}).\n"
-                f"💡 Consider reducing the goal amount or extending the timeline."
+            item = advice_item(
+                "Goals", "High", "goal.over_budget",
+                goal=goal.name, monthly_saving=monthly_saving_needed, monthly_savings=monthly_savings,
             )
-            priority = "High"
         else:
-            affordable_goals += 1
-            msg = (
-                f"📌 Goal: {goal['name']}\n"
-                f"🎯 Recommended Instrument: {ml_based_instrument}\n"
-                f"🤖 Confidence: {ml_confidence:.1f}%\n"
-                f"💰 Monthly Saving Required: ₹{monthly_saving_needed:,.0f} for {years_left} years\n"
-                f"📊 Projected Value: ₹{fv:,.0f}\n"
-                f"📈 Expected Return Rate: {metadata.get('expected_return', '7% p.a.')}\n"
-                f"🔍 {ml_based_instrument} Overview:\n"
-                f"• Risk: {metadata.get('risk', 'N/A')}\n"
-                f"• Lock-in: {metadata.get('lock_in', 'N/A')}\n"
-                f"• Liquidity: {metadata.get('liquidity', 'N/A')}\n"
-                f"• Tax Benefits: {metadata.get('tax_benefits', 'N/A')}"
+            item = advice_item(
+                "Goals", "Medium", "goal.recommendation",
+                goal=goal.name, instrument=ml_based_instrument, confidence=ml_confidence,
+                monthly_saving=monthly_saving_needed, years=years_left, projected_value=fv,
             )
-            priority = "Medium"
-
-        advice.append({
-            "category": "Goals",
-            "priority": priority,
-            "message": msg
-        })
-
-    if total_required_saving > monthly_savings:
-        if affordable_goals == 1:
-            suggestion = "You can comfortably handle only 1 of your financial goals at this time."
-        elif affordable_goals == 0:
-            suggestion = "Your current income does not support any of your financial goals. Start with emergency savings."
-        else:
-            suggestion = f"You can afford {affordable_goals} goals. Consider prioritizing the most important one."
-
-        advice.insert(1, {
-            "category": "Goals",
-            "priority": "High",
-            "message": (
-                f"❗ Your total required savings for all goals is ₹{total_required_saving:,.0f}/month, "
-                f"but your actual monthly savings is only ₹{monthly_savings:,.0f}.\n"
-                f"💡 Suggestion: {suggestion}"
-            )
-        })
+        item["projection"] = projection
+        advice.append(item)
+
+
+@rule("goal_shortfall")
+def _goal_shortfall(facts, advice):
+    total_required_saving = facts.total_required_saving
+    monthly_savings = facts.monthly_savings
+    if total_required_saving <= monthly_savings:
+        return
+
+    advice.insert(1, advice_item(
+        "Goals", "High", "goal.shortfall",
+        total_required_saving=total_required_saving, monthly_savings=monthly_savings,
+        affordable_goals=facts.affordable_goals,
+    ))
 
-    # Insurance Check
-    insurance_types = {ins["type"]: ins["coverage"] for ins in insurance}
-    age = user["age"]
-    annual_salary = salary * 12
 
-    recommended_health_cover = 300000 if age < 30 else 500000 if age <= 45 else 700000
-    health_coverage = insurance_types.get("Health Insurance", 0)
+@rule("health_cover")
+def _health_cover(facts, advice):
+    health_coverage = facts.health_coverage
+    recommended_health_cover = facts.recommended_health_cover
     if health_coverage <= 0:
-        advice.append({
-            "category": "Risk",
-            "priority": "High",
-            "message": "❌ You do not have health insurance. Please consider buying health coverage to protect your finances from medical emergencies."
-        })
+        advice.append(advice_item("Risk", "High", "health_cover.none"))
     elif health_coverage < recommended_health_cover:
-        advice.append({
-            "category": "Risk",
-            "priority": "Medium",
-            "message": f"Your health insurance (₹{health_coverage:,}) is below the recommended ₹{recommended_health_cover:,} for your age ({age}). Consider increasing it."
-        })
-
-    multiplier = 8 if salary < 30000 else 10 if salary <= 70000 else 12
-    recommended_term_cover = annual_salary * multiplier
-    term_coverage = insurance_types.get("Term Life Insurance", 0)
+        advice.append(advice_item(
+            "Risk", "Medium", "health_cover.low",
+            coverage=health_coverage, recommended=recommended_health_cover, age=facts.age,
+        ))
+
+
+@rule("term_cover")
+def _term_cover(facts, advice):
+    term_coverage = facts.term_coverage
+    recommended_term_cover = facts.recommended_term_cover
     if term_coverage <= 0:
-        advice.append({
-            "category": "Risk",
-            "priority": "High",
-            "message": "❌ You lack term life insurance. Consider a plan to protect your family’s income in case of emergencies."
-        })
+        advice.append(advice_item("Risk", "High", "term_cover.none"))
     elif term_coverage < recommended_term_cover:
-        advice.append({
-            "category": "Risk",
-            "priority": "Medium",
-            "message": f"Your term insurance (₹{term_coverage:,}) is below the recommended ₹{recommended_term_cover:,} based on your salary ({salary}/month). Consider increasing it."
-        })
-    
-     #----------------- Step 3: Smarter Insurance Advice ----------------- #
-    is_retirement_planned = any("retire" in g["name"].lower() for g in goals)
-    large_goals = [g for g in goals if g["amount"] >= 2000000]
-
-    if is_retirement_planned and age > 40 and health_coverage < 500000:
-        advice.append({
-            "category": "Risk",
-            "priority": "High",
-            "message": "🛡️ Planning for retirement? Ensure your health insurance is ₹500,000 or more to cover rising medical costs."
-        })
-
-    if large_goals and term_coverage < recommended_term_cover:
-        advice.append({
-            "category": "Risk",
-            "priority": "High",
-            "message": f"📌 You have major financial goals like '{large_goals[0]['name']}'. Consider increasing term life cover beyond ₹{recommended_term_cover:,}."
-        })
-
-    return advice
+        advice.append(advice_item(
+            "Risk", "Medium", "term_cover.low",
+            coverage=term_coverage, recommended=recommended_term_cover, salary=facts.salary,
+        ))
+
+
+@rule("retirement_health_cover")
+def _retirement_health_cover(facts, advice):
+    is_retirement_planned = any("retire" in g.name.lower() for g in facts.goals)
+    if is_retirement_planned and facts.age > 40 and facts.health_coverage < 500000:
+        advice.append(advice_item("Risk", "High", "retirement_health_cover"))
+
+
+@rule("large_goal_term_cover")
+def _large_goal_term_cover(facts, advice):
+    large_goals = [g for g in facts.goals if g.amount >= 2000000]
+    if large_goals and facts.term_coverage < facts.recommended_term_cover:
+        advice.append(advice_item(
+            "Risk", "High", "large_goal_term_cover",
+            goal=large_goals[0].name, recommended=facts.recommended_term_cover,
+        ))
+
+
+# ----------------- STREAMING ------------------
+# Section-by-section advice for /advisor/stream. Rules that don't need the model
+# run first; each deferred rule leaves a placeholder in the shared list, so later
+# inserts (goal shortfall at index 1) shift around it exactly as they would
+# around its items. Once predictions arrive the deferred rules run and their
+# items are spliced in at the placeholder, which reproduces generate_advice's
+# final order; order() reports it as the ids handed out with each item.
+class AdviceStream:
+    def __init__(self, user, goals, investments, insurance, current_year=None, structured=False):
+        self.facts = AdviceFacts(user, goals, investments, insurance, current_year=current_year)
+        self.structured = structured
+        self.advice = []
+        self.deferred = []   # (rule, placeholder)
+        self.ids = {}        # id(item) -> sequence number sent to the client (None: placeholder)
+        self.sent = 0
+
+    def _apply(self, rule, advice):
+        rule.apply(self.facts, advice)
+        new = [item for item in advice if id(item) not in self.ids]
+        for item in new:
+            self.ids[id(item)] = self.sent
+            self.sent += 1
+        return rule.name, [(self.ids[id(item)], self._output(item)) for item in new]
+
+    def _output(self, item):
+        return item if self.structured else render_item(item)
+
+    def rule_sections(self):
+        # Yields (rule name, [(id, item), ...]) per rule that doesn't wait on the model
+        for rule in RULES:
+            if rule.uses_predictions:
+                placeholder = object()
+                self.ids[id(placeholder)] = None
+                self.advice.append(placeholder)
+                self.deferred.append((rule, placeholder))
+                continue
+            section = self._apply(rule, self.advice)
+            if section[1]:
+                yield section
+
+    def prediction_sections(self, predictions, degraded=False):
+        # predictions: aligned with goal_model_inputs, as for generate_advice (None when degraded)
+        self.facts._predictions = predictions
+        self.facts.degraded = degraded
+        for rule, placeholder in self.deferred:
+            items = []
+            section = self._apply(rule, items)
+            index = next(i for i, item in enumerate(self.advice) if item is placeholder)
+            self.advice[index:index + 1] = items
+            if section[1]:
+                yield section
+
+    def order(self):
+        return [self.ids[id(item)] for item in self.advice]
+
+
+def generate_advice_batch(profiles, structured=False):
+    # profiles: (user, goals, investments, insurance) tuples.
+    # Yields the advice list or the raised exception for each profile, in order,
+    # scoring the goals of every profile with a single model call.
+    current_year = datetime.datetime.now().year
+    model_inputs = []
+    for user, goals, _, _ in profiles:
+        try:
+            model_inputs.append(goal_model_inputs(user, goals, current_year))
+        except Exception as e:
+            model_inputs.append(e)
+
+    flat_inputs = [row for rows in model_inputs if not isinstance(rows, Exception) for row in rows]
+    try:
+        flat_predictions = predict_instruments_batch(flat_inputs)
+    except Exception:
+        # A bad row poisons the shared call; fall back to scoring each profile on its own
+        flat_predictions = None
+
+    offset = 0
+    for (user, goals, investments, insurance), rows in zip(profiles, model_inputs):
+        if isinstance(rows, Exception):
+            yield rows
+            continue
+        predictions = None
+        if flat_predictions is not None:
+            predictions = flat_predictions[offset:offset + len(rows)]
+        offset += len(rows)
+        try:
+            yield generate_advice(user, goals, investments, insurance,
+                                  predictions=predictions, current_year=current_year, structured=structured)
+        except Exception as e:
+            yield e
 
 
 
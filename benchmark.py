@@ -0,0 +1,471 @@
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+# ----------------- Benchmark Suite ------------------
+# Latency/throughput at three layers, on payloads built from rows of
+# user_goal_dataset_3000.csv:
+#   model    classify_goal_description, predict_instrument, predict_instruments_batch
+#            (uncached), and predict_instrument answered by the prediction cache
+#   advisor  generate_advice in-process
+#   serialization  response encoding: the old jsonable_encoder + JSONResponse
+#                  path vs orjson, for text and format=structured bodies
+#   http     POST /advisor through an in-process ASGI client (needs httpx), with the
+#            response and prediction caches off; advisor_cached/* are repeat requests
+#            answered from the response cache
+#   portfolio  the investment rules alone on imported-statement sized holdings
+#              lists, 10 to 100k lines, to check they scale linearly
+#   validation  /advisor body -> generate_advice inputs, 1 to 10k investments:
+#               the previous BaseModel + .dict() path vs domain.py, rows and columns
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --compare bench.json        exit 1 on regression
+
+DATASET = "user_goal_dataset_3000.csv"
+
+# name -> (goals, investments)
+SCENARIOS = {
+    "minimal": (1, 0),
+    "typical": (3, 10),
+    "large": (10, 100),
+    "heavy": (50, 1000),
+}
+
+INSTRUMENTS = [
+    "PPF", "Debt Mutual Fund", "Equity Mutual Fund", "ELSS Mutual Fund", "Bank FD", "Post Office RD",
+    "Sovereign Gold Bonds", "ULIP", "NPS", "Real Estate Investment", "REITs", "Gold ETF", "Index Fund",
+    "Stocks", "Crypto", "Fixed Maturity Plan", "Insurance",
+]
+INSURANCE_TYPES = ["Health Insurance", "Term Life Insurance"]
+
+# Holdings per statement for the portfolio layer, each with few and with many distinct instruments
+PORTFOLIO_SIZES = (10, 100, 1000, 10000, 100000)
+PORTFOLIO_DISTINCT = (8, 500)
+
+# Investments per body for the validation layer
+VALIDATION_SIZES = (1, 10, 100, 1000, 10000)
+
+
+def load_rows(path=DATASET):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def build_payload(rows, n_goals, n_investments, rnd, current_year=None):
+    current_year = current_year or datetime.datetime.now().year
+    owner = rnd.choice(rows)
+    salary = float(owner["salary"])
+    return {
+        "user": {
+            "name": "bench",
+            "salary": salary,
+            "savings": float(owner["savings"]),
+            "age": int(owner["age"]),
+            "expenses": round(salary * rnd.uniform(0.3, 0.9)),
+            "job_type": rnd.choice(["salaried", "self-employed"]),
+            "dependents": rnd.randint(0, 3),
+        },
+        "goals": [
+            {
+                "name": row["goal"],
+                "amount": float(row["goal_amount"]),
+                "target_year": current_year + int(row["years_to_goal"]),
+                "saved_amount": float(rnd.randint(0, int(float(row["goal_amount"]) // 10))),
+            }
+            for row in rnd.sample(rows, n_goals)
+        ],
+        "investments": [
+            {"instrument_name": rnd.choice(INSTRUMENTS), "amount": float(rnd.randint(1000, 500000)), "type": ""}
+            for _ in range(n_investments)
+        ],
+        "insurance": [
+            {"type": kind, "coverage": float(rnd.choice([300000, 1000000, 10000000])), "amount": float(rnd.randint(5000, 30000))}
+            for kind in INSURANCE_TYPES
+            if rnd.random() < 0.7
+        ],
+    }
+
+
+def summarize(samples):
+    samples = np.asarray(samples)
+    return {
+        "n": int(len(samples)),
+        "mean_ms": round(float(samples.mean()) * 1e3, 4),
+        "p50_ms": round(float(np.percentile(samples, 50)) * 1e3, 4),
+        "p95_ms": round(float(np.percentile(samples, 95)) * 1e3, 4),
+        "p99_ms": round(float(np.percentile(samples, 99)) * 1e3, 4),
+        "throughput_per_s": round(len(samples) / float(samples.sum()), 2) if samples.sum() else None,
+    }
+
+
+def measure(fn, args_list, warmup=5):
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+# ----------------- Layers ------------------
+def bench_model(rows, iterations, rnd):
+    from goal_classifier import classify_goal_description
+    from ml_investment_predictor import predict_instrument, predict_instruments_batch
+    from prediction_store import prediction_cache
+
+    results = {}
+    descriptions = [(rnd.choice(rows)["goal"],) for _ in range(iterations)]
+    results["classify_goal_description"] = measure(classify_goal_description, descriptions)
+
+    def model_input(row):
+        return {
+            "age": int(row["age"]),
+            "salary": float(row["salary"]),
+            "savings": float(row["savings"]),
+            "risk_profile": row["risk_profile"],
+            "goal": row["goal"],
+            "goal_amount": float(row["goal_amount"]),
+            "years_to_goal": int(row["years_to_goal"]),
+        }
+
+    # The model itself: both prediction cache tiers off, as they would mostly hit on these rows
+    tiers = prediction_cache.memory, prediction_cache.shared
+    prediction_cache.memory = prediction_cache.shared = None
+    try:
+        singles = [(model_input(rnd.choice(rows)),) for _ in range(iterations)]
+        results["predict_instrument"] = measure(predict_instrument, singles)
+
+        for name, (n_goals, _) in SCENARIOS.items():
+            batches = [([model_input(row) for row in rnd.sample(rows, n_goals)],) for _ in range(iterations)]
+            results[f"predict_instruments_batch/{name}"] = measure(predict_instruments_batch, batches)
+    finally:
+        prediction_cache.memory, prediction_cache.shared = tiers
+
+    # Same single rows answered by the prediction cache (primed first, so every call hits a tier)
+    for args in singles:
+        predict_instrument(*args)
+    results["predict_instrument/cached"] = measure(predict_instrument, singles)
+    return results
+
+
+def advice_args(payload):
+    from domain import AdvisorInput
+
+    parsed = AdvisorInput.from_dict(payload)
+    return parsed.user, parsed.goals, parsed.investments, parsed.insurance
+
+
+def bench_advisor(payloads_by_scenario):
+    from ai_advisor import generate_advice
+
+    results = {}
+    for name, payloads in payloads_by_scenario.items():
+        args = [advice_args(p) for p in payloads]
+        results[f"generate_advice/{name}"] = measure(generate_advice, args)
+    return results
+
+
+def bench_serialization(payloads_by_scenario):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse, ORJSONResponse
+
+    from ai_advisor import generate_advice
+    from main import advisor_response
+
+    encoders = {
+        "text/jsonable_encoder": ("text", lambda body: JSONResponse(jsonable_encoder(body)).body),
+        "text/orjson": ("text", lambda body: ORJSONResponse(body).body),
+        "structured/orjson": ("structured", lambda body: ORJSONResponse(body).body),
+    }
+    results = {}
+    for name, payloads in payloads_by_scenario.items():
+        bodies = {}
+        for response_format in ("text", "structured"):
+            bodies[response_format] = [
+                advisor_response(args[0], generate_advice(*args, structured=response_format == "structured"), response_format)
+                for args in map(advice_args, payloads)
+            ]
+        for label, (response_format, encode) in encoders.items():
+            stats = measure(encode, [(body,) for body in bodies[response_format]])
+            stats["mean_bytes"] = round(float(np.mean([len(encode(body)) for body in bodies[response_format]])))
+            results[f"{label}/{name}"] = stats
+    return results
+
+
+def bench_http(payloads_by_scenario, concurrency):
+    try:
+        import httpx
+    except ImportError:
+        print("httpx is not installed; skipping the http layer", file=sys.stderr)
+        return {}
+    from main import app
+    from model_registry import registry
+    from prediction_store import prediction_cache
+    from response_cache import response_cache
+
+    registry.warm_up()
+
+    async def run():
+        results = {}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # The advisor itself: payloads repeat between warm-up, samples and the concurrent
+            # run, so the response and prediction caches are off (no If-None-Match is sent either)
+            cache_size, tiers = response_cache.maxsize, (prediction_cache.memory, prediction_cache.shared)
+            response_cache.maxsize = 0
+            prediction_cache.memory = prediction_cache.shared = None
+            try:
+                for name, payloads in payloads_by_scenario.items():
+                    results[f"advisor/{name}"] = await measure_http(client, payloads, concurrency)
+            finally:
+                response_cache.maxsize = cache_size
+                prediction_cache.memory, prediction_cache.shared = tiers
+
+            # Repeat requests answered from the response cache, as a separate series
+            for name, payloads in payloads_by_scenario.items():
+                for payload in payloads:
+                    (await client.post("/advisor", json=payload)).raise_for_status()
+                results[f"advisor_cached/{name}"] = await measure_http(client, payloads, concurrency, warmup=0)
+        return results
+
+    return asyncio.run(run())
+
+
+async def measure_http(client, payloads, concurrency, warmup=5):
+    for payload in payloads[:warmup]:
+        await client.post("/advisor", json=payload)
+
+    samples = []
+    for payload in payloads:
+        started = time.perf_counter()
+        response = await client.post("/advisor", json=payload)
+        samples.append(time.perf_counter() - started)
+        response.raise_for_status()
+    result = summarize(samples)
+
+    # Throughput with `concurrency` requests in flight
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(payload):
+        async with semaphore:
+            (await client.post("/advisor", json=payload)).raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(send(p) for p in payloads))
+    result["concurrent_throughput_per_s"] = round(len(payloads) / (time.perf_counter() - started), 2)
+    return result
+
+
+def bench_portfolio(iterations, rnd):
+    from ai_advisor import RULES, AdviceFacts, render_item
+    from domain import Insurance, Investment, InvestmentColumns, User
+
+    rules = [r for r in RULES if r.name in ("diversification", "allocation", "asset_class_exposure")]
+    user = User(name="bench", salary=80000.0, savings=500000.0, age=35, expenses=40000.0)
+    insurance = (Insurance(type="Health Insurance", coverage=500000.0, amount=12000.0),)
+
+    def investment_advice(investments):
+        facts = AdviceFacts(user, [], investments, insurance)
+        advice = []
+        for r in rules:
+            r.apply(facts, advice)
+        return [render_item(item) for item in advice]
+
+    results = {}
+    for size in PORTFOLIO_SIZES:
+        for distinct in PORTFOLIO_DISTINCT:
+            names = INSTRUMENTS + [f"Imported Fund {i}" for i in range(distinct - len(INSTRUMENTS))]
+            investments = tuple(
+                Investment(instrument_name=rnd.choice(names), amount=float(rnd.randint(1000, 500000)))
+                for _ in range(size)
+            )
+            columns = InvestmentColumns(
+                instrument_name=[inv.instrument_name for inv in investments],
+                amount=[inv.amount for inv in investments],
+            )
+            # Fewer samples for the big statements; each is already a long run
+            samples = min(iterations, max(10, 200000 // size))
+            for label, holdings in (("investment_rules", investments), ("investment_rules_columns", columns)):
+                stats = measure(investment_advice, [(holdings,)] * samples)
+                stats["ns_per_holding"] = round(stats["p50_ms"] * 1e6 / size)
+                results[f"{label}/{size}x{distinct}"] = stats
+    return results
+
+
+def bench_validation(rows, iterations, rnd):
+    from typing import List
+
+    import orjson
+    from pydantic import BaseModel
+
+    from domain import parse_advisor_input
+
+    # The previous /advisor input path, for reference: FastAPI-style BaseModels, a dict
+    # copy of every entry for the rules, and model_dump_json for the response cache key
+    class User(BaseModel):
+        name: str
+        salary: float
+        savings: float
+        age: int
+        expenses: float
+        job_type: str = "salaried"
+        dependents: int = 0
+
+    class Goal(BaseModel):
+        name: str
+        amount: float
+        target_year: int
+        saved_amount: float = 0
+
+    class Investment(BaseModel):
+        instrument_name: str
+        amount: float
+        type: str = ""
+
+    class Insurance(BaseModel):
+        type: str
+        coverage: float
+        amount: float
+
+    class AdvisorInput(BaseModel):
+        user: User
+        goals: List[Goal]
+        investments: List[Investment]
+        insurance: List[Insurance]
+
+    def pydantic_models(body):
+        payload = AdvisorInput.model_validate_json(body)
+        copies = (
+            payload.user.model_dump(),
+            [g.model_dump() for g in payload.goals],
+            [i.model_dump() for i in payload.investments],
+            [ins.model_dump() for ins in payload.insurance],
+        )
+        return copies, payload.model_dump_json()
+
+    results = {}
+    for size in VALIDATION_SIZES:
+        payload = build_payload(rows, 3, size, rnd)
+        investments = payload["investments"]
+        columnar = dict(payload, investments={
+            "instrument_name": [inv["instrument_name"] for inv in investments],
+            "amount": [inv["amount"] for inv in investments],
+            "type": [inv["type"] for inv in investments],
+        })
+        body, columnar_body = orjson.dumps(payload), orjson.dumps(columnar)
+        samples = min(iterations, max(10, 100000 // size))
+        for label, fn, data in (
+            ("pydantic_models", pydantic_models, body),
+            ("domain_rows", parse_advisor_input, body),
+            ("domain_columns", parse_advisor_input, columnar_body),
+        ):
+            stats = measure(fn, [(data,)] * samples)
+            stats["ns_per_investment"] = round(stats["p50_ms"] * 1e6 / size)
+            results[f"{label}/{size}"] = stats
+    return results
+
+
+# ----------------- Comparison ------------------
+def compare(baseline, current, threshold):
+    # A benchmark regresses when its p50 or p95 grows by more than `threshold`
+    regressions = []
+    for layer, benches in current["results"].items():
+        for name, stats in benches.items():
+            before = baseline["results"].get(layer, {}).get(name)
+            if not before:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                if before[metric] and stats[metric] > before[metric] * (1 + threshold):
+                    regressions.append({
+                        "benchmark": f"{layer}/{name}",
+                        "metric": metric,
+                        "baseline": before[metric],
+                        "current": stats[metric],
+                        "change": round(stats[metric] / before[metric] - 1, 3),
+                    })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the model, advisor, HTTP, portfolio and validation layers")
+    parser.add_argument("--layers", default="model,advisor,serialization,http,portfolio,validation")
+    parser.add_argument("--iterations", type=int, default=200, help="samples per benchmark")
+    parser.add_argument("--concurrency", type=int, default=16, help="in-flight requests for the HTTP throughput run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative slowdown before flagging")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    rows = load_rows()
+    layers = args.layers.split(",")
+    payloads_by_scenario = {
+        name: [build_payload(rows, n_goals, n_investments, rnd) for _ in range(args.iterations)]
+        for name, (n_goals, n_investments) in SCENARIOS.items()
+    }
+
+    results = {}
+    if "model" in layers:
+        results["model"] = bench_model(rows, args.iterations, rnd)
+    if "advisor" in layers:
+        results["advisor"] = bench_advisor(payloads_by_scenario)
+    if "serialization" in layers:
+        results["serialization"] = bench_serialization(payloads_by_scenario)
+    if "http" in layers:
+        results["http"] = bench_http(payloads_by_scenario, args.concurrency)
+    if "portfolio" in layers:
+        results["portfolio"] = bench_portfolio(args.iterations, rnd)
+    if "validation" in layers:
+        results["validation"] = bench_validation(rows, args.iterations, rnd)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "inference_engine": os.environ.get("INFERENCE_ENGINE", "native"),
+            "iterations": args.iterations,
+            "scenarios": SCENARIOS,
+        },
+        "results": results,
+    }
+
+    for layer, benches in results.items():
+        for name, stats in benches.items():
+            size = f"  {stats['mean_bytes']:>9,} B" if "mean_bytes" in stats else ""
+            if "ns_per_holding" in stats:
+                size = f"  {stats['ns_per_holding']:>6} ns/holding"
+            if "ns_per_investment" in stats:
+                size = f"  {stats['ns_per_investment']:>6} ns/investment"
+            print(f"{layer:8} {name:42} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  p99 {stats['p99_ms']:9.3f} ms{size}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['benchmark']} {r['metric']}: {r['baseline']} -> {r['current']} ms ({r['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
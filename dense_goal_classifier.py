@@ -0,0 +1,138 @@
+import csv
+import json
+import re
+import sys
+
+import numpy as np
+
+# ----------------- Dense Goal Classifier ------------------
+# TF-IDF + LogisticRegression folded into one (vocabulary x classes) table:
+#   score[c] = sum_t tf[t] * idf[t] * coef[c, t] / ||tf * idf|| + intercept[c]
+# so classifying a phrase is a regex tokenize, a few dict lookups and a
+# weighted sum, with no sparse matrices and no scikit-learn import. Matches
+# TfidfVectorizer(ngram_range=(1, 1)) + LogisticRegression.predict; see
+# check_parity below.
+
+
+class DenseGoalClassifier:
+    def __init__(self, vocabulary, idf, coef, intercept, classes, lowercase=True,
+                 token_pattern=r"(?u)\b\w\w+\b", norm="l2", sublinear_tf=False):
+        self.vocabulary = vocabulary                  # token -> column
+        self.idf = np.asarray(idf, dtype=np.float64)
+        coef = np.asarray(coef, dtype=np.float64)
+        # Binary LogisticRegression keeps one row for the positive class
+        self.binary = coef.shape[0] == 1
+        self.weights = (coef * self.idf).T            # (vocabulary, classes): idf x coef per token
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.lowercase = lowercase
+        self.token_pattern = re.compile(token_pattern)
+        self.norm = norm
+        self.sublinear_tf = sublinear_tf
+
+    @classmethod
+    def from_arrays(cls, arrays, vectorizer_params):
+        # arrays: goal_classifier.npz as written by export_artifacts.py / train.py
+        _check_params(vectorizer_params)
+        vocabulary = {token: index for index, token in enumerate(arrays["vocabulary"].tolist())}
+        return cls(
+            vocabulary, arrays["idf"], arrays["coef"], arrays["intercept"], arrays["classes"],
+            lowercase=vectorizer_params["lowercase"],
+            token_pattern=vectorizer_params["token_pattern"],
+            norm=vectorizer_params["norm"],
+            sublinear_tf=vectorizer_params["sublinear_tf"],
+        )
+
+    @classmethod
+    def from_sklearn(cls, model, vectorizer):
+        params = vectorizer.get_params()
+        _check_params(params)
+        if params["preprocessor"] is not None or params["tokenizer"] is not None or params["stop_words"] is not None \
+                or params["strip_accents"] is not None or params["analyzer"] != "word":
+            raise ValueError("Only the default word analyzer is supported by the dense classifier")
+        return cls(
+            {token: int(index) for token, index in vectorizer.vocabulary_.items()},
+            vectorizer.idf_ if params["use_idf"] else np.ones(len(vectorizer.vocabulary_)),
+            model.coef_, model.intercept_, model.classes_,
+            lowercase=params["lowercase"],
+            token_pattern=params["token_pattern"],
+            norm=params["norm"],
+            sublinear_tf=params["sublinear_tf"],
+        )
+
+    def decision_function(self, descriptions):
+        # Flatten every known token of every description into (row, column) pairs,
+        # count repeats, then scatter-add the weighted rows into the score matrix
+        rows, columns = [], []
+        vocabulary = self.vocabulary
+        for row, text in enumerate(descriptions):
+            if self.lowercase:
+                text = text.lower()
+            for token in self.token_pattern.findall(text):
+                column = vocabulary.get(token)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+
+        scores = np.zeros((len(descriptions), self.weights.shape[1]))
+        if rows:
+            pairs, tf = np.unique(np.array(rows) * len(self.idf) + np.array(columns), return_counts=True)
+            rows, columns = np.divmod(pairs, len(self.idf))
+            tf = tf.astype(np.float64)
+            if self.sublinear_tf:
+                tf = 1 + np.log(tf)
+            np.add.at(scores, rows, tf[:, None] * self.weights[columns])
+            if self.norm == "l2":
+                norms = np.sqrt(np.bincount(rows, (tf * self.idf[columns]) ** 2, minlength=len(descriptions)))
+            elif self.norm == "l1":
+                norms = np.bincount(rows, np.abs(tf * self.idf[columns]), minlength=len(descriptions))
+            else:
+                norms = np.ones(len(descriptions))
+            scores /= np.where(norms > 0, norms, 1)[:, None]
+        return scores + self.intercept
+
+    def predict(self, descriptions):
+        scores = self.decision_function(descriptions)
+        if self.binary:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[scores.argmax(axis=1)]
+
+
+def _check_params(params):
+    if tuple(params["ngram_range"]) != (1, 1):
+        raise ValueError(f"Dense classifier supports unigrams only, got ngram_range={params['ngram_range']}")
+    if params["norm"] not in ("l2", "l1", None):
+        raise ValueError(f"Unsupported norm: {params['norm']}")
+
+
+def check_parity(model, vectorizer, path="goal_training_data_v2.csv"):
+    # Every training description plus case/spacing/unknown-token variants, through both paths
+    with open(path, newline="", encoding="utf-8") as f:
+        descriptions = [row["goal_description"] for row in csv.DictReader(f)]
+    descriptions = list(dict.fromkeys(descriptions))
+    variants = [d.upper() for d in descriptions] + [f"  {d}  zzz-unknown " for d in descriptions] + ["", "!!", "a"]
+    texts = descriptions + variants
+
+    dense = DenseGoalClassifier.from_sklearn(model, vectorizer)
+    expected_scores = model.decision_function(vectorizer.transform(texts))
+    scores = dense.decision_function(texts)
+    if expected_scores.ndim == 1:
+        expected_scores = expected_scores[:, None]
+        scores = scores - dense.intercept + model.intercept_
+    expected = model.predict(vectorizer.transform(texts))
+    predicted = dense.predict(texts)
+    mismatches = int((expected != predicted).sum())
+    return {
+        "rows": len(texts),
+        "max_abs_diff": float(np.abs(expected_scores - scores).max()),
+        "label_mismatches": mismatches,
+        "ok": mismatches == 0,
+    }
+
+
+if __name__ == "__main__":
+    import joblib
+
+    report = check_parity(joblib.load("goal_classifier.pkl"), joblib.load("goal_vectorizer.pkl"))
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
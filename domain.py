@@ -0,0 +1,132 @@
+from dataclasses import dataclass, field
+from typing import Annotated, List, Tuple, Union
+
+from pydantic import Discriminator, Field, Tag, TypeAdapter
+
+from metrics import stage
+
+# ----------------- Domain Model ------------------
+# What generate_advice reads: slotted, frozen dataclasses that Pydantic builds
+# straight from the request bytes (validate_json), with no intermediate
+# BaseModel or dict copies. Field names, types and defaults are the API schema.
+#
+# Investments come in either of two shapes:
+#   rows      [{"instrument_name": "PPF", "amount": 50000}, ...]
+#   columns   {"instrument_name": ["PPF", ...], "amount": [50000, ...]}
+# Columns skip per-holding object validation entirely and are aggregated as
+# arrays (see portfolio.py); prefer them for statements with thousands of rows.
+
+# Latest goal year accepted; goal planning compounds monthly up to it, and much
+# further out overflows a float
+MAX_TARGET_YEAR = 9999
+TargetYear = Annotated[int, Field(le=MAX_TARGET_YEAR)]
+
+
+@dataclass(slots=True, frozen=True)
+class User:
+    name: str
+    salary: float
+    savings: float
+    age: int
+    expenses: float
+    job_type: str = "salaried"
+    dependents: int = 0
+
+
+@dataclass(slots=True, frozen=True)
+class Goal:
+    name: str
+    amount: float
+    target_year: TargetYear
+    saved_amount: float = 0
+
+
+@dataclass(slots=True, frozen=True)
+class Investment:
+    instrument_name: str
+    amount: float
+    type: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class InvestmentColumns:
+    instrument_name: List[str]
+    amount: List[float]
+    type: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        if len(self.amount) != len(self.instrument_name):
+            raise ValueError("instrument_name and amount must have the same length")
+        if self.type and len(self.type) != len(self.instrument_name):
+            raise ValueError("type must be omitted or have one entry per instrument")
+
+    def __len__(self):
+        return len(self.instrument_name)
+
+
+@dataclass(slots=True, frozen=True)
+class Insurance:
+    type: str
+    coverage: float
+    amount: float
+
+
+def _investments_shape(value):
+    return "columns" if isinstance(value, dict) else "rows"
+
+
+Investments = Annotated[
+    Union[Annotated[Tuple[Investment, ...], Tag("rows")], Annotated[InvestmentColumns, Tag("columns")]],
+    Discriminator(_investments_shape),
+]
+
+
+@dataclass(slots=True, frozen=True)
+class AdvisorInput:
+    user: User
+    goals: Tuple[Goal, ...]
+    investments: Investments
+    insurance: Tuple[Insurance, ...]
+
+    @classmethod
+    def from_dict(cls, data):
+        # Trusted in-process input (golden cases, benchmarks): plain constructors, no
+        # validation or coercion, so values keep their exact types
+        investments = data["investments"]
+        return cls(
+            user=User(**data["user"]),
+            goals=tuple(Goal(**g) for g in data["goals"]),
+            investments=InvestmentColumns(**investments) if isinstance(investments, dict)
+            else tuple(Investment(**inv) for inv in investments),
+            insurance=tuple(Insurance(**ins) for ins in data["insurance"]),
+        )
+
+
+ADVISOR_INPUT = TypeAdapter(AdvisorInput)
+
+
+def parse_advisor_input(body):
+    # body: raw JSON bytes/str, or already-decoded objects; raises pydantic.ValidationError
+    with stage("validation"):
+        if isinstance(body, (bytes, bytearray, str)):
+            return ADVISOR_INPUT.validate_json(body)
+        return ADVISOR_INPUT.validate_python(body)
+
+
+def advisor_input_schema():
+    # JSON schema for the OpenAPI request body, with $defs inlined (OpenAPI resolves
+    # "#/$defs/..." against the whole document, not this fragment)
+    schema = ADVISOR_INPUT.json_schema()
+    defs = schema.pop("$defs", {})
+
+    def inline(node):
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if ref is not None:
+                return inline(defs[ref.rsplit("/", 1)[-1]])
+            return {key: inline(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [inline(value) for value in node]
+        return node
+
+    return inline(schema)
@@ -0,0 +1,93 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+
+from model_registry import ARTIFACT_DIR, MANIFEST_FILE
+
+# ----------------- Artifact Export ------------------
+# Converts the joblib pickles into load-fast, pickle-free formats:
+#   xgb_investment_model.ubj   XGBoost native UBJSON (native engine)
+#   xgb_investment_model.json  XGBoost native JSON (compiled engine, no xgboost import)
+#   xgb_label_encoders.npz     class arrays per label encoder
+#   goal_classifier.npz        TF-IDF vocabulary/idf + logistic regression weights
+#   manifest.json              file checksums and vectorizer settings
+
+# What an export (or train.py) writes, and so what the manifest checksums
+ARTIFACT_FILES = ("xgb_investment_model.ubj", "xgb_investment_model.json", "xgb_label_encoders.npz", "goal_classifier.npz")
+
+VECTORIZER_PARAMS = ["lowercase", "token_pattern", "ngram_range", "norm", "use_idf", "smooth_idf", "sublinear_tf"]
+
+
+def export_investment_model(model, encoders, out_dir):
+    model.save_model(os.path.join(out_dir, "xgb_investment_model.ubj"))
+    model.save_model(os.path.join(out_dir, "xgb_investment_model.json"))
+    np.savez(
+        os.path.join(out_dir, "xgb_label_encoders.npz"),
+        **{name: np.asarray(encoder.classes_).astype(str) for name, encoder in encoders.items()}
+    )
+
+
+def export_goal_classifier(model, vectorizer, out_dir):
+    vocabulary = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    for token, index in vectorizer.vocabulary_.items():
+        vocabulary[index] = token
+    np.savez(
+        os.path.join(out_dir, "goal_classifier.npz"),
+        vocabulary=vocabulary.astype(str),
+        idf=vectorizer.idf_,
+        coef=model.coef_,
+        intercept=model.intercept_,
+        classes=model.classes_,
+    )
+    params = vectorizer.get_params()
+    return {name: params[name] for name in VECTORIZER_PARAMS}
+
+
+def write_manifest(out_dir, vectorizer_params, artifact_files=ARTIFACT_FILES, **extra):
+    # extra: training metadata from train.py (version, feature order, classes, metrics, ...).
+    # Only the files this export wrote are checksummed: the directory may also hold
+    # versions/, a prediction table or other leftovers.
+    files = {}
+    for name in sorted(artifact_files):
+        with open(os.path.join(out_dir, name), "rb") as f:
+            files[name] = hashlib.sha256(f.read()).hexdigest()
+
+    manifest = {
+        "format": 1,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "files": files,
+        "vectorizer_params": vectorizer_params,
+        **extra,
+    }
+    with open(os.path.join(out_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model pickles to native artifact formats")
+    parser.add_argument("--out", default=ARTIFACT_DIR)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    export_investment_model(
+        joblib.load("xgb_investment_model.pkl"),
+        joblib.load("xgb_label_encoders.pkl"),
+        args.out,
+    )
+    vectorizer_params = export_goal_classifier(
+        joblib.load("goal_classifier.pkl"),
+        joblib.load("goal_vectorizer.pkl"),
+        args.out,
+    )
+    manifest = write_manifest(args.out, vectorizer_params)
+    print(f"Wrote {len(manifest['files'])} artifacts to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
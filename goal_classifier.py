@@ -1,8 +1,13 @@
-import joblib
+import csv
+import os
+import threading
+from collections import OrderedDict, namedtuple
 
-# Load the model and vectorizer
-model = joblib.load("goal_classifier.pkl")
-vectorizer = joblib.load("goal_vectorizer.pkl")
+import numpy as np
+
+from dense_goal_classifier import DenseGoalClassifier
+from metrics import register_collector, stage
+from model_registry import registry
 
 # Optional: Label name map
 goal_categories = {
@@ -15,7 +20,192 @@ goal_categories = {
     6: "Travel Abroad"
 }
 
+GOAL_CACHE_SIZE = int(os.environ.get("GOAL_CACHE_SIZE", "4096"))
+GOAL_TRAINING_DATA = "goal_training_data_v2.csv"
+
+# "dense": folded idf x coef table (dense_goal_classifier.py, no scikit-learn at serve time);
+# "sklearn": TfidfVectorizer.transform + LogisticRegression.predict
+GOAL_CLASSIFIER_ENGINE = os.environ.get("GOAL_CLASSIFIER_ENGINE", "dense")
+if GOAL_CLASSIFIER_ENGINE not in ("dense", "sklearn"):
+    raise ValueError(f"Unknown GOAL_CLASSIFIER_ENGINE: {GOAL_CLASSIFIER_ENGINE}")
+
+
+def normalize_description(description: str) -> str:
+    # The vectorizer lowercases and tokenizes on word boundaries, so folding
+    # case and whitespace never changes the predicted label
+    return " ".join(description.lower().split())
+
+
+class GoalCache:
+    # Exact-match index (never evicted) in front of a bounded LRU of past lookups
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.exact = {}
+        self.lru = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            label = self.exact.get(key)
+            if label is None:
+                label = self.lru.get(key)
+                if label is None:
+                    self.misses += 1
+                    return None
+                self.lru.move_to_end(key)
+            self.hits += 1
+            return label
+
+    def put(self, key, label):
+        with self.lock:
+            if key in self.exact or self.maxsize <= 0:
+                return
+            self.lru[key] = label
+            self.lru.move_to_end(key)
+            while len(self.lru) > self.maxsize:
+                self.lru.popitem(last=False)
+                self.evictions += 1
+
+    def seed(self, labels):
+        with self.lock:
+            self.exact.update(labels)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "exact_entries": len(self.exact),
+                "lru_entries": len(self.lru),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# One per model version: cached labels are only valid for the model that produced them.
+# With the dense engine, model is a DenseGoalClassifier and vectorizer is None.
+GoalClassifier = namedtuple("GoalClassifier", ["model", "vectorizer", "cache"])
+
+
+def _predict(classifier, descriptions):
+    if classifier.vectorizer is None:
+        return classifier.model.predict(descriptions)
+    return classifier.model.predict(classifier.vectorizer.transform(descriptions))
+
+
 def classify_goal_description(description: str) -> int:
-    vec = vectorizer.transform([description])
-    label = model.predict(vec)[0]
-    return label
+    with stage("classify_goal"):
+        classifier = registry.get("goal_classifier")
+        key = normalize_description(description)
+        label = classifier.cache.get(key)
+        if label is None:
+            label = int(_predict(classifier, [key])[0])
+            classifier.cache.put(key, label)
+        return label
+
+# Classify many descriptions; only cache misses go through a (single) model call.
+# remember=False skips storing misses, so one-off bulk imports don't flush the LRU.
+def classify_goal_descriptions(descriptions, remember=True):
+    if not descriptions:
+        return np.array([], dtype=np.int64)
+
+    with stage("classify_goal"):
+        classifier = registry.get("goal_classifier")
+        keys = [normalize_description(d) for d in descriptions]
+        labels = [classifier.cache.get(key) for key in keys]
+
+        missing = list(dict.fromkeys(key for key, label in zip(keys, labels) if label is None))
+        if missing:
+            predicted = dict(zip(missing, (int(label) for label in _predict(classifier, missing))))
+            if remember:
+                for key, label in predicted.items():
+                    classifier.cache.put(key, label)
+            labels = [predicted[key] if label is None else label for key, label in zip(keys, labels)]
+
+        return np.array(labels, dtype=np.int64)
+
+
+def goal_cache_stats():
+    # Active version's cache; empty until the classifier has loaded
+    classifier = registry.peek("goal_classifier")
+    return (classifier.cache if classifier else GoalCache(GOAL_CACHE_SIZE)).stats()
+
+
+@register_collector
+def _goal_cache_metrics():
+    stats = goal_cache_stats()
+    yield "goal_cache_hits_total", "counter", "Goal classifier cache hits", [({}, stats["hits"])]
+    yield "goal_cache_misses_total", "counter", "Goal classifier cache misses", [({}, stats["misses"])]
+    yield "goal_cache_evictions_total", "counter", "Goal classifier LRU evictions", [({}, stats["evictions"])]
+    yield "goal_cache_entries", "gauge", "Goal classifier cache entries", [
+        ({"tier": "exact"}, stats["exact_entries"]),
+        ({"tier": "lru"}, stats["lru_entries"]),
+    ]
+
+
+def _seed_goal_cache(classifier):
+    # Canonical goal names plus every training description, labelled by the
+    # model itself so cached answers always agree with the uncached path
+    descriptions = list(goal_categories.values())
+    if os.path.exists(GOAL_TRAINING_DATA):
+        with open(GOAL_TRAINING_DATA, newline="", encoding="utf-8") as f:
+            descriptions += [row["goal_description"] for row in csv.DictReader(f)]
+
+    keys = list(dict.fromkeys(normalize_description(d) for d in descriptions))
+    labels = _predict(classifier, keys)
+    classifier.cache.seed(dict(zip(keys, (int(label) for label in labels))))
+
+
+# ----------------- Model Loading ------------------
+def _load_goal_classifier(version):
+    if version.manifest and GOAL_CLASSIFIER_ENGINE == "dense":
+        # Straight from the exported arrays; scikit-learn is never imported
+        arrays = np.load(version.path("goal_classifier.npz"))
+        model, vectorizer = DenseGoalClassifier.from_arrays(arrays, version.manifest["vectorizer_params"]), None
+    elif version.manifest:
+        model, vectorizer = _load_native(version)
+    else:
+        import joblib
+        model = joblib.load("goal_classifier.pkl")
+        vectorizer = joblib.load("goal_vectorizer.pkl")
+        if GOAL_CLASSIFIER_ENGINE == "dense":
+            model, vectorizer = DenseGoalClassifier.from_sklearn(model, vectorizer), None
+    classifier = GoalClassifier(model, vectorizer, GoalCache(GOAL_CACHE_SIZE))
+    _seed_goal_cache(classifier)
+    return classifier
+
+
+def _load_native(version):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    arrays = np.load(version.path("goal_classifier.npz"))
+    params = dict(version.manifest["vectorizer_params"])
+    params["ngram_range"] = tuple(params["ngram_range"])
+
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = {token: index for index, token in enumerate(arrays["vocabulary"].tolist())}
+    vectorizer.idf_ = arrays["idf"]
+
+    model = LogisticRegression()
+    model.coef_ = arrays["coef"]
+    model.intercept_ = arrays["intercept"]
+    model.classes_ = arrays["classes"]
+    return model, vectorizer
+
+
+registry.register("goal_classifier", _load_goal_classifier)
+
+
+def __getattr__(name):
+    # Backwards-compatible module attributes, resolved through the registry
+    if name == "model":
+        return registry.get("goal_classifier").model
+    if name == "vectorizer":
+        return registry.get("goal_classifier").vectorizer
+    if name == "goal_cache":
+        return registry.get("goal_classifier").cache
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,127 @@
+import argparse
+import json
+import random
+import sys
+
+from ai_advisor import generate_advice
+from domain import AdvisorInput
+
+# ----------------- Golden Advice Check ------------------
+# Pins generate_advice output for a fixed set of synthetic profiles, with the
+# current year pinned too. Run after any change to the rules:
+#   python golden_advice.py            verify against golden_advice.json
+#   python golden_advice.py --update   re-record (after an intended change)
+
+GOLDEN_FILE = "golden_advice.json"
+GOLDEN_YEAR = 2025
+
+GOAL_NAMES = [
+    "Retirement", "Buy a House", "kids education", "Emergency Fund", "tax saving", "new car",
+    "Travel Abroad", "vacation to europe", "plan to retire early", "Child Education", "wedding",
+]
+INSTRUMENTS = [
+    "PPF", "Bank FD", "Equity Mutual Fund", "Stocks", "NPS", "Gold ETF", "Crypto", "Insurance",
+    "ULIP", "Debt Mutual Fund", "Sovereign Gold Bonds", "REITs",
+]
+INSURANCE_TYPES = ["Health Insurance", "Term Life Insurance", "Vehicle Insurance"]
+
+# Imported statements for the array paths in portfolio.py: more holdings than
+# VECTORIZE_MIN_HOLDINGS and more distinct instruments than ALLOCATION_TOP_N
+FUND_NAMES = [f"Index Fund {n:02d}" for n in range(1, 41)]
+LARGE_PORTFOLIOS = [(120, "rows"), (400, "columns")]
+
+
+def build_cases(count=80, seed=7):
+    rnd = random.Random(seed)
+    cases = []
+    for i in range(count):
+        salary = float(rnd.choice([5000, 9000, 20000, 45000, 80000, 150000, rnd.randint(1000, 300000)]))
+        user = {
+            "name": f"user-{i}",
+            "salary": salary,
+            "savings": float(rnd.randint(0, 2000000)),
+            "age": rnd.randint(20, 65),
+            "expenses": float(rnd.randint(0, int(salary * 1.3))),
+            "job_type": rnd.choice(["salaried", "self-employed", "Self-Employed"]),
+            "dependents": rnd.randint(0, 3),
+        }
+        goals = [
+            {
+                "name": rnd.choice(GOAL_NAMES),
+                "amount": float(rnd.randint(10000, 9000000)),
+                "target_year": rnd.randint(GOLDEN_YEAR - 5, GOLDEN_YEAR + 35),
+                "saved_amount": float(rnd.randint(0, 50000)),
+            }
+            for _ in range(rnd.randint(0, 6))
+        ]
+        investments = [
+            {"instrument_name": rnd.choice(INSTRUMENTS), "amount": float(rnd.randint(0, 500000)), "type": ""}
+            for _ in range(rnd.choice([0, 0, 1, 2, 5, 20]))
+        ]
+        insurance = [
+            {
+                "type": rnd.choice(INSURANCE_TYPES),
+                "coverage": float(rnd.choice([0, 200000, 600000, 5000000, 20000000])),
+                "amount": float(rnd.randint(0, 30000)),
+            }
+            for _ in range(rnd.randint(0, 3))
+        ]
+        cases.append({"user": user, "goals": goals, "investments": investments, "insurance": insurance})
+    return cases + build_large_portfolio_cases(seed)
+
+
+def build_large_portfolio_cases(seed):
+    rnd = random.Random(seed)
+    cases = []
+    for i, (holdings, layout) in enumerate(LARGE_PORTFOLIOS):
+        names = [rnd.choice(FUND_NAMES + INSTRUMENTS) for _ in range(holdings)]
+        amounts = [float(rnd.randint(1000, 200000)) for _ in range(holdings)]
+        if layout == "columns":
+            investments = {"instrument_name": names, "amount": amounts}
+        else:
+            investments = [{"instrument_name": name, "amount": amount, "type": ""} for name, amount in zip(names, amounts)]
+        cases.append({
+            "user": {
+                "name": f"portfolio-{i}", "salary": 150000.0, "savings": 2500000.0, "age": 45,
+                "expenses": 60000.0, "job_type": "salaried", "dependents": 2,
+            },
+            "goals": [{"name": "Retirement", "amount": 20000000.0, "target_year": GOLDEN_YEAR + 15, "saved_amount": 500000.0}],
+            "investments": investments,
+            "insurance": [{"type": "Health Insurance", "coverage": 1000000.0, "amount": 20000.0}],
+        })
+    return cases
+
+
+def run_case(case):
+    payload = AdvisorInput.from_dict(case)
+    advice = generate_advice(
+        payload.user, payload.goals, payload.investments, payload.insurance, current_year=GOLDEN_YEAR
+    )
+    # Round-trip so numpy scalars compare like the stored JSON
+    return json.loads(json.dumps(advice, default=float))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or re-record golden generate_advice output")
+    parser.add_argument("--update", action="store_true")
+    args = parser.parse_args()
+
+    if args.update:
+        cases = build_cases()
+        golden = [{"input": case, "advice": run_case(case)} for case in cases]
+        with open(GOLDEN_FILE, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False, indent=1)
+        print(f"Recorded {len(golden)} golden cases")
+        return
+
+    with open(GOLDEN_FILE, encoding="utf-8") as f:
+        golden = json.load(f)
+    failures = [i for i, item in enumerate(golden) if run_case(item["input"]) != item["advice"]]
+    print(f"{len(golden) - len(failures)}/{len(golden)} golden cases match")
+    if failures:
+        print(f"Mismatched cases: {failures}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
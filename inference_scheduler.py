@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+
+from fastapi.concurrency import run_in_threadpool
+
+from metrics import histogram, register_collector
+from ml_investment_predictor import predict_instruments_batch
+from model_registry import registry
+
+# Collect concurrent predict work for up to this long, or until this many rows are queued
+BATCH_WINDOW_MS = float(os.environ.get("INFERENCE_BATCH_WINDOW_MS", "2"))
+BATCH_MAX_ROWS = int(os.environ.get("INFERENCE_BATCH_MAX_ROWS", "256"))
+
+# Rows queued or being scored past which the scheduler reports itself saturated
+# (admission control then serves /advisor without the model); 0 never saturates
+MAX_INFLIGHT_ROWS = int(os.environ.get("INFERENCE_MAX_INFLIGHT_ROWS", "4096"))
+
+BATCH_ROWS = histogram(
+    "inference_batch_size_rows",
+    "Goal rows per scheduler batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+
+
+# ----------------- Micro-batching Scheduler ------------------
+# Requests hand their goal rows to predict(); rows from every request that
+# arrives within the window are scored with one predict_instruments_batch call
+# on a worker thread, and each request gets back its own slice.
+class InferenceScheduler:
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_rows=BATCH_MAX_ROWS, predict_fn=predict_instruments_batch,
+                 max_inflight_rows=MAX_INFLIGHT_ROWS):
+        self.window = window_ms / 1000
+        self.max_rows = max_rows
+        self.max_inflight_rows = max_inflight_rows
+        self.predict_fn = predict_fn
+        self._pending = []
+        self._pending_rows = 0
+        self._inflight_rows = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.requests = 0
+        self.max_queue_depth = 0
+
+    async def predict(self, rows):
+        if not rows:
+            return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Scored with the version this request is pinned to, whatever is active by then
+        self._pending.append((rows, future, registry.current()))
+        self._pending_rows += len(rows)
+        self._inflight_rows += len(rows)
+        self.max_queue_depth = max(self.max_queue_depth, self._pending_rows)
+
+        if self._pending_rows >= self.max_rows:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        if pending:
+            asyncio.get_running_loop().create_task(self._run(pending))
+
+    def saturated(self):
+        return 0 < self.max_inflight_rows <= self._inflight_rows
+
+    async def _run(self, pending):
+        try:
+            results = await run_in_threadpool(self._score, pending)
+        except Exception as e:
+            results = [e] * len(pending)
+        # Counted until scored, even for requests that stopped waiting
+        self._inflight_rows -= sum(len(rows) for rows, _, _ in pending)
+        for (_, future, _), result in zip(pending, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _score(self, pending):
+        self._record_batch(len(pending), sum(len(rows) for rows, _, _ in pending))
+        # One model call per version; a batch only spans two while a reload drains the old one
+        by_version = {}
+        for i, (_, _, version) in enumerate(pending):
+            by_version.setdefault(version, []).append(i)
+        results = [None] * len(pending)
+        for version, indices in by_version.items():
+            scored = self._score_version([pending[i][0] for i in indices], version)
+            for i, result in zip(indices, scored):
+                results[i] = result
+        return results
+
+    def _score_version(self, requests, version):
+        flat = [row for rows in requests for row in rows]
+        try:
+            with registry.pinned(version):
+                predictions = self.predict_fn(flat)
+        except Exception:
+            # One bad request shouldn't fail the others sharing its batch
+            return [self._score_one(rows, version) for rows in requests]
+
+        results, offset = [], 0
+        for rows in requests:
+            results.append(predictions[offset:offset + len(rows)])
+            offset += len(rows)
+        return results
+
+    def _score_one(self, rows, version):
+        try:
+            with registry.pinned(version):
+                return self.predict_fn(rows)
+        except Exception as e:
+            return e
+
+    def _record_batch(self, requests, rows):
+        with self._lock:
+            self.batches += 1
+            self.requests += requests
+            self.rows += rows
+        BATCH_ROWS.observe(rows)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window_ms": self.window * 1000,
+                "max_rows": self.max_rows,
+                "queue_depth": self._pending_rows,
+                "inflight_rows": self._inflight_rows,
+                "max_inflight_rows": self.max_inflight_rows,
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "requests": self.requests,
+                "rows": self.rows,
+                "avg_batch_rows": round(self.rows / self.batches, 2) if self.batches else 0,
+            }
+
+
+scheduler = InferenceScheduler()
+
+
+@register_collector
+def _scheduler_metrics():
+    stats = scheduler.stats()
+    yield "inference_queue_depth", "gauge", "Goal rows waiting for the next inference batch", [({}, stats["queue_depth"])]
+    yield "inference_inflight_rows", "gauge", "Goal rows queued or being scored", [({}, stats["inflight_rows"])]
+    yield "inference_queue_depth_max", "gauge", "Largest queue depth seen", [({}, stats["max_queue_depth"])]
+    yield "inference_batches_total", "counter", "Inference batches run by the scheduler", [({}, stats["batches"])]
+    yield "inference_batch_rows_total", "counter", "Goal rows scored by the scheduler", [({}, stats["rows"])]
+    yield "inference_batch_requests_total", "counter", "Requests served by the scheduler", [({}, stats["requests"])]
@@ -0,0 +1,256 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# ----------------- Prediction Lookup Table ------------------
+# INFERENCE_ENGINE=table: instrument predictions precomputed offline over a grid
+# of the model's 7 features, so serving a goal is an index computation plus one
+# read from a memory-mapped array. Continuous features are bucketed at quantiles
+# of the training data and scored at each bucket's training median; the small
+# discrete ones (risk, goal, years) get one cell per value. Each cell is also
+# scored at its corners (the bucket edges); a cell whose corners don't all get
+# the centre's label is marked unstable, and rows landing in it are scored by
+# the exact model, like rows outside the grid. The table is only valid for the
+# artifact version it was built from; the loader refuses any other, and any
+# table whose agreement with the exact model is below
+# PREDICTION_TABLE_MIN_AGREEMENT.
+#
+#   MODEL_ARTIFACT_DIR=artifacts python lookup_table.py            build + agreement
+#   python lookup_table.py --bins age=12,salary=16                  finer grid
+#   python lookup_table.py --check                                  agreement only
+
+TABLE_FILE = "prediction_table.npy"
+SPEC_FILE = "prediction_table.json"
+DATASET = "user_goal_dataset_3000.csv"
+
+# Buckets per continuous feature
+DEFAULT_BINS = {"age": 8, "salary": 10, "savings": 6, "goal_amount": 8}
+
+# One cell per value: risk and goal codes (risk_mapping / goal_mapping) and whole years
+DISCRETE_VALUES = {
+    "risk_profile": list(range(3)),
+    "goal": list(range(7)),
+    "years_to_goal": list(range(1, 31)),
+}
+
+# label: index into the label encoder's classes; confidence: percent x 10, as served;
+# stable: the model agrees with label across the whole cell, so the table may answer it
+CELL_DTYPE = np.dtype([("label", np.uint8), ("confidence", np.uint16), ("stable", np.bool_)])
+
+
+class PredictionTable:
+    def __init__(self, spec, cells):
+        self.spec = spec
+        self.cells = cells
+        self.classes = spec["classes"]
+        features = spec["features"]
+        shape = [len(f["points"]) for f in features]
+        # Row-major strides, so a row's cell is its per-feature indices dotted with these
+        self.strides = np.cumprod([1] + shape[:0:-1])[::-1].astype(np.int64)
+        self.low = np.array([f["edges"][0] if "edges" in f else f["points"][0] for f in features])
+        self.high = np.array([f["edges"][-1] if "edges" in f else f["points"][-1] for f in features])
+        self.bucketed = [(j, np.asarray(f["edges"][1:-1])) for j, f in enumerate(features) if "edges" in f]
+        self.discrete = np.array([j for j, f in enumerate(features) if "edges" not in f])
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, SPEC_FILE), encoding="utf-8") as f:
+            spec = json.load(f)
+        # Memory-mapped: pages are shared between workers and only touched cells are read in
+        cells = np.load(os.path.join(directory, TABLE_FILE), mmap_mode="r")
+        return cls(spec, cells)
+
+    def lookup(self, X):
+        # X: (rows, 7) in FEATURE_COLUMNS order -> (label index, confidence, hit mask);
+        # rows off the grid or in unstable cells are misses, for the exact model
+        X = np.asarray(X, dtype=np.float64)
+        discrete = X[:, self.discrete]
+        in_grid = ((X >= self.low) & (X <= self.high)).all(axis=1) & (discrete == np.floor(discrete)).all(axis=1)
+
+        index = np.empty(X.shape, dtype=np.int64)
+        index[:, self.discrete] = np.where(in_grid[:, None], discrete - self.low[self.discrete], 0)
+        for j, inner_edges in self.bucketed:
+            index[:, j] = np.searchsorted(inner_edges, X[:, j], side="right")
+
+        label = np.zeros(len(X), dtype=np.int64)
+        # float32, like the booster's probabilities, so both sources round to the same values
+        confidence = np.zeros(len(X), dtype=np.float32)
+        hit = in_grid.copy()
+        if in_grid.any():
+            cells = self.cells[index[in_grid] @ self.strides]
+            label[in_grid] = cells["label"]
+            confidence[in_grid] = cells["confidence"] / 10
+            hit[in_grid] = cells["stable"]
+        return label, confidence, hit
+
+
+# ----------------- Building ------------------
+def grid_spec(rows, bins):
+    # rows: training DataFrame with encoded risk_profile/goal columns
+    from ml_investment_predictor import FEATURE_COLUMNS
+
+    features = []
+    for name in FEATURE_COLUMNS:
+        if name in DISCRETE_VALUES:
+            features.append({"name": name, "points": DISCRETE_VALUES[name]})
+            continue
+        values = rows[name].to_numpy(dtype=np.float64)
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins[name] + 1)))
+        bucket = np.clip(np.searchsorted(edges[1:-1], values, side="right"), 0, len(edges) - 2)
+        points = [float(np.median(values[bucket == b])) for b in range(len(edges) - 1)]
+        features.append({"name": name, "edges": edges.tolist(), "points": points})
+    return features
+
+
+def _score_grid(axes, predict_proba, chunk_rows, progress=None):
+    # Yields (start, stop, probabilities) over the row-major product of the axes' values
+    axes = [np.asarray(a, dtype=np.float64) for a in axes]
+    shape = tuple(len(a) for a in axes)
+    total = int(np.prod(shape))
+    for start in range(0, total, chunk_rows):
+        stop = min(start + chunk_rows, total)
+        index = np.unravel_index(np.arange(start, stop), shape)
+        yield start, stop, predict_proba(np.column_stack([a[i] for a, i in zip(axes, index)]))
+        if progress:
+            progress(stop)
+
+
+def build_table(features, predict_proba, chunk_rows=65536, progress=None):
+    shape = tuple(len(f["points"]) for f in features)
+    # Corners: bucket edges for continuous features; discrete ones have no extent
+    corner_axes = [f.get("edges", f["points"]) for f in features]
+    corner_shape = tuple(len(a) for a in corner_axes)
+    cells = np.empty(int(np.prod(shape)), dtype=CELL_DTYPE)
+    total = len(cells) + int(np.prod(corner_shape))
+
+    for start, stop, prob in _score_grid(
+        [f["points"] for f in features], predict_proba, chunk_rows, progress and (lambda done: progress(done, total)),
+    ):
+        label = prob.argmax(axis=1)
+        cells["label"][start:stop] = label
+        # Same rounding as the exact path: np.round(p * 100, 1) == rint(p * 1000) / 10
+        cells["confidence"][start:stop] = np.rint(prob[np.arange(len(label)), label] * 1000)
+
+    corners = np.empty(int(np.prod(corner_shape)), dtype=np.uint8)
+    for start, stop, prob in _score_grid(
+        corner_axes, predict_proba, chunk_rows, progress and (lambda done: progress(len(cells) + done, total)),
+    ):
+        corners[start:stop] = prob.argmax(axis=1)
+
+    # Stable: every corner of the cell gets the same label as its centre
+    corners = corners.reshape(corner_shape)
+    label = cells["label"].reshape(shape)
+    stable = np.ones(shape, dtype=bool)
+    bucketed = [j for j, f in enumerate(features) if "edges" in f]
+    for offsets in itertools.product((0, 1), repeat=len(bucketed)):
+        view = [slice(None)] * len(shape)
+        for j, offset in zip(bucketed, offsets):
+            view[j] = slice(offset, offset + shape[j])
+        stable &= corners[tuple(view)] == label
+    cells["stable"] = stable.ravel()
+    return cells
+
+
+def agreement(table, rows, predict_proba):
+    # Table vs exact model on the training rows; misses fall back to the model, so they always agree
+    from ml_investment_predictor import FEATURE_COLUMNS
+
+    X = rows[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    prob = predict_proba(X)
+    exact_label = prob.argmax(axis=1)
+    exact_confidence = np.round(prob[np.arange(len(X)), exact_label] * 100, 1)
+    label, confidence, hit = table.lookup(X)
+    matches = label[hit] == exact_label[hit]
+    return {
+        "rows": len(X),
+        "stable_cells": round(float(table.cells["stable"].mean()), 4),
+        "table_rows": round(float(hit.mean()), 4),
+        "table_agreement": round(float(matches.mean()), 4) if hit.any() else None,
+        "agreement": round(float((matches.sum() + (~hit).sum()) / len(X)), 4),
+        "mean_abs_confidence_diff": round(float(np.abs(confidence - exact_confidence)[hit].mean()), 2)
+        if hit.any() else None,
+    }
+
+
+def load_training_rows(path=DATASET):
+    import pandas as pd
+
+    from ml_investment_predictor import goal_mapping, risk_mapping
+
+    rows = pd.read_csv(path)
+    rows["risk_profile"] = rows["risk_profile"].map(risk_mapping)
+    rows["goal"] = rows["goal"].map(goal_mapping)
+    return rows.dropna(subset=["risk_profile", "goal"])
+
+
+def parse_bins(text):
+    bins = dict(DEFAULT_BINS)
+    for part in filter(None, (text or "").split(",")):
+        name, _, count = part.partition("=")
+        if name not in bins:
+            raise SystemExit(f"--bins: {name!r} is not a bucketed feature ({', '.join(bins)})")
+        bins[name] = int(count)
+    return bins
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the INFERENCE_ENGINE=table prediction table")
+    parser.add_argument("--bins", help="buckets per continuous feature, e.g. age=8,salary=10")
+    parser.add_argument("--data", default=DATASET, help="training CSV for bucket edges and the agreement check")
+    parser.add_argument("--chunk-rows", type=int, default=65536)
+    parser.add_argument("--check", action="store_true", help="only report agreement for the existing table")
+    args = parser.parse_args()
+
+    # The exact model of the active artifacts (MODEL_ARTIFACT_DIR); the table is written next to it
+    from ml_investment_predictor import TABLE_MIN_AGREEMENT  # also registers the model loaders
+    from model_registry import registry
+
+    version = registry.current()
+    model = version.get("investment_model")
+    classes = version.get("label_encoders")["selected_instrument"].classes_.tolist()
+    rows = load_training_rows(args.data)
+
+    if args.check:
+        table = PredictionTable.load(version.directory)
+        print(json.dumps(agreement(table, rows, model.predict_proba), indent=2))
+        return
+
+    features = grid_spec(rows, parse_bins(args.bins))
+    started = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\r{done:,}/{total:,} cells ({done / total:.0%})", end="", file=sys.stderr, flush=True)
+
+    cells = build_table(features, model.predict_proba, args.chunk_rows, progress)
+    print(file=sys.stderr)
+    spec = {
+        "model_version": version.version,
+        "built_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "build_seconds": round(time.perf_counter() - started, 1),
+        "classes": classes,
+        "features": features,
+        "cells": len(cells),
+        "bytes": cells.nbytes,
+    }
+    spec["agreement"] = agreement(PredictionTable(spec, cells), rows, model.predict_proba)
+
+    np.save(os.path.join(version.directory, TABLE_FILE), cells)
+    with open(os.path.join(version.directory, SPEC_FILE), "w", encoding="utf-8") as f:
+        json.dump(spec, f, indent=2)
+    print(json.dumps({k: spec[k] for k in ("model_version", "cells", "bytes", "build_seconds", "agreement")}, indent=2))
+    if spec["agreement"]["agreement"] < TABLE_MIN_AGREEMENT:
+        print(
+            f"warning: agreement {spec['agreement']['agreement']:.1%} is below PREDICTION_TABLE_MIN_AGREEMENT "
+            f"({TABLE_MIN_AGREEMENT:.1%}); INFERENCE_ENGINE=table will refuse this table",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,104 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
-from ai_advisor import generate_advice
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import datetime
+import os
+import threading
+from contextlib import asynccontextmanager, nullcontext
+import numpy as np
+import orjson
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse, PlainTextResponse, Response, StreamingResponse
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import List, Literal
+from ai_advisor import (
+    ASSET_CLASSES, AdviceStream, generate_advice, generate_advice_batch, goal_model_inputs, instrument_metadata, referenced_instruments,
+)
+from admission import RETRY_AFTER_SECONDS, Overloaded, admission
+from domain import AdvisorInput, InvestmentColumns, TargetYear, advisor_input_schema, parse_advisor_input
 from fastapi.middleware.cors import CORSMiddleware
+from goal_classifier import classify_goal_descriptions, goal_categories
+from inference_scheduler import scheduler
+from metrics import SIZE_BUCKETS, histogram, render, stage
+from ml_investment_predictor import INFERENCE_ENGINE, goal_mapping, risk_mapping, table_stats
+from model_registry import LAZY_LOAD, read_manifest, registry
+from prediction_store import prediction_cache
+from profiling import SORT_KEYS, profile_store
+from projections import EXTRA_PROFILES, RISK_VOLATILITY
+from response_cache import etag_matches, response_cache
+from starlette.background import BackgroundTask
+from scenarios import AXES, DEFAULT_RISK_PROFILE, MAX_SCENARIOS, grid_columns, list_columns, sweep
+
+registry.record_timing("import.main", time.perf_counter() - _import_started)
+
+# Number of users scored together per model call on /advisor/batch
+BATCH_CHUNK_SIZE = int(os.environ.get("ADVISOR_BATCH_CHUNK_SIZE", "512"))
+
+# Largest /advisor/batch upload, in bytes and in records; past either it's a 413.
+# The body is held in memory while the batch streams back, so this bounds it.
+BATCH_MAX_BYTES = int(os.environ.get("ADVISOR_BATCH_MAX_BYTES", str(32 * 1024 * 1024)))
+BATCH_MAX_RECORDS = int(os.environ.get("ADVISOR_BATCH_MAX_RECORDS", "10000"))
+
+# Most descriptions accepted by one /classify-goals call
+GOAL_CLASSIFY_MAX_ITEMS = int(os.environ.get("GOAL_CLASSIFY_MAX_ITEMS", "10000"))
+
+# Shared secret for the /admin endpoints (X-Admin-Token header); unset disables them
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if LAZY_LOAD:
+        # Start serving immediately; /readyz flips once the background warm-up is done
+        threading.Thread(target=registry.warm_up, name="model-warm-up", daemon=True).start()
+    else:
+        registry.warm_up()
+    # MODEL_WATCH_INTERVAL > 0: hot-reload when the artifact directory changes. Under
+    # serve.py every worker runs its own watcher; an /admin call only reaches one worker.
+    registry.watch()
+    yield
+
+
+REQUEST_SECONDS = histogram("http_request_seconds", "End-to-end request latency", ["route", "method"])
+REQUEST_ITEMS = histogram("advisor_request_items", "Items per /advisor request", ["kind"], buckets=SIZE_BUCKETS)
+
+
+class RequestTimingMiddleware:
+    # Plain ASGI so streaming responses are timed to their last byte. Also pins one
+    # model version for the whole request and tags the response with it, so the header
+    # names the version that answered even if a reload swaps in another meanwhile.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_version(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-model-version", registry.current().version.encode()))
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            with registry.pinned():
+                await self.app(scope, receive, send_with_version)
+        finally:
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route=route.path if route is not None else "unmatched",
+                method=scope["method"],
+            )
+
 
 # Initialize FastAPI first
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(RequestTimingMiddleware)
 
 # Enable CORS middleware
 app.add_middleware(
@@ -14,71 +107,514 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Model-Version", "X-Advisor-Degraded", "X-Profile-Id", "Retry-After"],  # ETag goes back as If-None-Match
+)
+
+# Any edit to these tables changes what /advisor returns, so it flushes the response cache
+response_cache.watch(
+    instrument_metadata=instrument_metadata,
+    asset_classes=ASSET_CLASSES,
+    risk_volatility=RISK_VOLATILITY,
+    extra_profiles=EXTRA_PROFILES,
+    risk_mapping=risk_mapping,
+    goal_mapping=goal_mapping,
 )
 
 # ------------------- Data Models -------------------
-class User(BaseModel):
-    name: str
-    salary: float
-    savings: float
-    age: int
-    expenses: float
-    job_type: str = "salaried"
-    dependents: int = 0
-
-class Goal(BaseModel):
-    name: str
-    amount: float
-    target_year: int
-    saved_amount: float = 0
-
-class Investment(BaseModel):
-    instrument_name: str
-    amount: float
-    type: str = ""
-
-class Insurance(BaseModel):
-    type: str
-    coverage: float
-    amount:float
-
-class AdvisorInput(BaseModel):
-    user: User
-    goals: List[Goal]
-    investments: List[Investment]
-    insurance: List[Insurance]
+# /advisor bodies are validated straight from the request bytes into the domain
+# dataclasses (domain.py) instead of being declared as FastAPI body parameters,
+# which would decode to dicts, build BaseModels and then copy them again for the
+# rules. The schema is still published for the docs.
+ADVISOR_REQUEST_BODY = {
+    "requestBody": {"required": True, "content": {"application/json": {"schema": advisor_input_schema()}}},
+}
+
+
+async def advisor_input(request: Request):
+    # Dependency -> (AdvisorInput, raw body); the raw bytes are kept for error echoes and profiles.
+    # Validation runs on a worker thread, like the rest of /advisor's CPU work.
+    body = await request.body()
+    try:
+        return await run_in_threadpool(parse_advisor_input, body), body
+    except ValidationError as e:
+        # Same 422 shape FastAPI gives its own body parameters; a body that isn't JSON isn't echoed back
+        errors = [
+            {**error, "loc": ("body", *error["loc"]), **({"input": {}} if error["type"] == "json_invalid" else {})}
+            for error in e.errors(include_url=False)
+        ]
+        raise RequestValidationError(errors, body=body)
+
+# ------------------- Health -------------------
+@app.get("/healthz")
+def healthz():
+    health = {
+        "status": "ok",
+        **registry.status(),
+        "scheduler": scheduler.stats(),
+        "admission": admission.stats(),
+        "profiling": profile_store.stats(),
+        "response_cache": response_cache.stats(),
+        "prediction_cache": prediction_cache.stats(),
+    }
+    if INFERENCE_ENGINE == "table":
+        health["prediction_table"] = table_stats()
+    return health
+
+
+@app.get("/readyz")
+def readyz():
+    status = registry.status()
+    return ORJSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+# ------------------- Admin -------------------
+def require_admin(x_admin_token: str = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled; set ADMIN_TOKEN")
+    if x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+class ReloadRequest(BaseModel):
+    # Artifact directory to switch to (e.g. artifacts/versions/<version> from train.py);
+    # omitted re-reads the active directory
+    path: str | None = None
+
+
+@app.post("/admin/models/reload", dependencies=[Depends(require_admin)])
+async def reload_models(body: ReloadRequest | None = None):
+    path = body.path if body else None
+    if path is not None and read_manifest(path) is None:
+        raise HTTPException(status_code=400, detail=f"No manifest.json in {path}")
+    try:
+        # Loads, warms and validates off the event loop; requests keep flowing meanwhile
+        return await run_in_threadpool(registry.reload, path)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Reload rejected: {e}")
+
+
+# Profiles captured from /advisor (see profiling.py), newest first
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles(limit: int = Query(50, ge=1, le=1000)):
+    return {**profile_store.stats(), "profiles": profile_store.recent(limit)}
+
+
+# Hot functions summed over recent profiles; min_duration_ms narrows it to the slow requests
+@app.get("/admin/profiles/aggregate", dependencies=[Depends(require_admin)])
+def aggregate_profiles(
+    limit: int = Query(100, ge=1, le=1000),
+    sort: Literal[SORT_KEYS] = "tottime",
+    top: int = Query(30, ge=1, le=500),
+    min_duration_ms: float = 0,
+):
+    return profile_store.aggregate(limit, sort, top, min_duration_ms)
+
+
+# format=pstats downloads the raw cProfile data (pstats.Stats / snakeviz)
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str, response_format: Literal["json", "pstats"] = Query("json", alias="format")):
+    meta = profile_store.get(profile_id)
+    path = profile_store.stats_file(profile_id)
+    if meta is None or path is None:
+        raise HTTPException(status_code=404, detail=f"No profile {profile_id}")
+    if response_format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+    return meta
+
+
+def profile_forced(request):
+    # X-Profile: 1 forces a profile, but only for callers holding the admin token
+    return (
+        ADMIN_TOKEN is not None
+        and request.headers.get("x-profile") in ("1", "true")
+        and request.headers.get("x-admin-token") == ADMIN_TOKEN
+    )
+
+
+def request_shape(payload, raw_body, response_format):
+    # What drives /advisor latency, without the user's figures
+    investments = payload.investments
+    return {
+        "format": response_format,
+        "body_bytes": len(raw_body),
+        "goals": len(payload.goals),
+        "investments": len(investments),
+        "investment_layout": "columns" if isinstance(investments, InvestmentColumns) else "rows",
+        "insurance": len(payload.insurance),
+        "goal_descriptions": [goal.name[:80] for goal in payload.goals[:20]],
+    }
+
 
 # ------------------- Route -------------------
-@app.post("/advisor")
-def get_advice(payload: AdvisorInput):
+@app.post("/advisor", openapi_extra=ADVISOR_REQUEST_BODY)
+async def get_advice(
+    request: Request,
+    parsed=Depends(advisor_input),
+    response_format: Literal["text", "structured"] = Query("text", alias="format"),
+):
+    payload, raw_body = parsed
     try:
-        user = payload.user.dict()
-        goals = [g.dict() for g in payload.goals]
-        investments = [i.dict() for i in payload.investments]
-        insurance = [ins.dict() for ins in payload.insurance]
+        REQUEST_ITEMS.observe(len(payload.goals), kind="goals")
+        REQUEST_ITEMS.observe(len(payload.investments), kind="investments")
+        REQUEST_ITEMS.observe(len(payload.insurance), kind="insurance")
+
+        # Unchanged profile: answer from the ETag or the cache without running any rule
+        # (forced profiling skips both, so the same payload can be profiled repeatedly)
+        forced = profile_forced(request)
+        current_year = datetime.datetime.now().year
+        key = response_cache.key(payload, current_year, response_format)
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if not forced and etag_matches(request.headers.get("if-none-match"), etag):
+            response_cache.record_not_modified()
+            return Response(status_code=304, headers=headers)
+        body = None if forced else response_cache.get(key)
+        if body is not None:
+            return Response(body, media_type="application/json", headers=headers)
+
+        profile = profile_store.sample(forced)
 
+        # Cache hits above are served even under overload; everything below holds a slot
+        async with admission.admit("/advisor") as deadline:
+            user, goals = payload.user, payload.goals
+
+            # Goal inference is micro-batched with other in-flight requests; skipped when
+            # the scheduler is saturated or the latency budget runs out. Profiled requests
+            # score their goals inline instead, so classifier and booster calls are in the profile.
+            if profile is None:
+                predictions, degraded = await admission.predict(goal_model_inputs(user, goals, current_year), deadline)
+            else:
+                predictions, degraded = None, None
+
+            # Rules, projections, rendering and serialization on a worker thread, so the
+            # event loop keeps serving other requests and the scheduler's batching timer
+            response = await run_in_threadpool(
+                render_advice, payload, predictions, degraded, current_year, response_format, headers, profile
+            )
+
+        if degraded is not None:
+            return response
+        response_cache.put(key, response.body)
+        if profile is not None:
+            response.headers["X-Profile-Id"] = profile.id
+            response.background = BackgroundTask(
+                profile_store.save, profile, request_shape(payload, raw_body, response_format),
+                route="/advisor", model_version=registry.current().version,
+            )
+        return response
+
+    except Overloaded as e:
+        raise overloaded(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def overloaded(e):
+    # Shed request -> 503 the client may retry after RETRY_AFTER_SECONDS
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+
+def render_advice(payload, predictions, degraded, current_year, response_format, headers, profile=None):
+    # The CPU-bound part of /advisor -> ORJSONResponse; a profile covers it all, on this thread only
+    user = payload.user
+    with profile or nullcontext():
         advice = generate_advice(
             user=user,
-            goals=goals,
-            investments=investments,
-            insurance=insurance
+            goals=payload.goals,
+            investments=payload.investments,
+            insurance=payload.insurance,
+            predictions=predictions,
+            current_year=current_year,
+            structured=response_format == "structured",
+            degraded=degraded is not None,
         )
 
-        # Include additional fields like savings summary
-        monthly_savings = user["salary"] - user.get("expenses", 0)
-
-        return {
-            "user": {
-                "name": user.get("name"),
-                "salary": user.get("salary"),
-                "age": user.get("age"),
-                "savings": user.get("savings"),
-                "expenses": user.get("expenses"),
-            },
-            "monthly_savings": monthly_savings,
-            "advice": advice
-        }
+    if degraded is not None:
+        # Neither cached nor tagged, so the next request gets the full advice
+        body = advisor_response(user, advice, response_format)
+        body["degraded"] = degraded
+        with stage("serialization"):
+            return ORJSONResponse(body, headers={"Cache-Control": "no-store", "X-Advisor-Degraded": degraded})
+
+    with profile or nullcontext(), stage("serialization"):
+        return ORJSONResponse(advisor_response(user, advice, response_format), headers=headers)
+
+
+def advisor_response(user, advice, response_format="text"):
+    # Include additional fields like savings summary
+    monthly_savings = user.salary - user.expenses
+
+    response = {
+        "user": {
+            "name": user.name,
+            "salary": user.salary,
+            "age": user.age,
+            "savings": user.savings,
+            "expenses": user.expenses,
+        },
+        "monthly_savings": monthly_savings,
+        "advice": advice
+    }
+    if response_format == "structured":
+        # Items carry template IDs and params (see advice_templates.py); instrument
+        # details are sent once here instead of inside every goal item
+        response["format"] = "structured"
+        response["instruments"] = referenced_instruments(advice)
+    return response
+
+
+# ------------------- Streaming Route -------------------
+# Server-Sent Events: a "summary" event, then one "advice" event per rule section
+# as soon as it is computed (rule-based sections first, goal sections once their
+# inference completes), then "complete" with the final order of the item ids.
+# Clients that need the exact /advisor list sort the items they got by "order".
+# The stream holds an admission slot like /advisor: shed with a 503 before any
+# event, or degraded goal sections ("degraded" in "complete") under load.
+@app.post("/advisor/stream", openapi_extra=ADVISOR_REQUEST_BODY)
+async def stream_advice(
+    parsed=Depends(advisor_input),
+    response_format: Literal["text", "structured"] = Query("text", alias="format"),
+):
+    payload, _ = parsed
+    REQUEST_ITEMS.observe(len(payload.goals), kind="goals")
+    REQUEST_ITEMS.observe(len(payload.investments), kind="investments")
+    REQUEST_ITEMS.observe(len(payload.insurance), kind="insurance")
+
+    try:
+        deadline = await admission.acquire("/advisor/stream")
+    except Overloaded as e:
+        raise overloaded(e)
+    return AdmittedStreamingResponse(
+        _advice_events(payload, response_format, deadline),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    # Gives the admission slot back once the stream ends, however it ends; the body
+    # generator's own finally wouldn't run if the client left before it started
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            admission.release()
 
+
+# Same options as ORJSONResponse
+SSE_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def sse_event(event, data):
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, option=SSE_OPTIONS) + b"\n\n"
+
+
+async def in_threadpool(sections):
+    # Steps a generator of advice sections on a worker thread, yielding each as it is ready
+    done = object()
+    while (section := await run_in_threadpool(next, sections, done)) is not done:
+        yield section
+
+
+async def _advice_events(payload, response_format, deadline):
+    user, goals = payload.user, payload.goals
+    current_year = datetime.datetime.now().year
+    advice = AdviceStream(
+        user, goals, payload.investments, payload.insurance,
+        current_year=current_year,
+        structured=response_format == "structured",
+    )
+    # Inference starts now and overlaps the rule-based sections below
+    predictions = asyncio.ensure_future(admission.predict(goal_model_inputs(user, goals, current_year), deadline))
+    try:
+        summary = advisor_response(user, [])
+        del summary["advice"]
+        yield sse_event("summary", summary)
+        async for section, items in in_threadpool(advice.rule_sections()):
+            yield sse_event("advice", {"section": section, "items": [{"id": i, **item} for i, item in items]})
+        predicted, degraded = await predictions
+        async for section, items in in_threadpool(advice.prediction_sections(predicted, degraded is not None)):
+            yield sse_event("advice", {"section": section, "items": [{"id": i, **item} for i, item in items]})
+
+        complete = {"order": advice.order()}
+        if degraded is not None:
+            complete["degraded"] = degraded
+        if response_format == "structured":
+            complete["format"] = "structured"
+            complete["instruments"] = referenced_instruments(advice.advice)
+        yield sse_event("complete", complete)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # Headers are already sent; report the failure in-band
+        yield sse_event("error", {"detail": str(e)})
+    finally:
+        predictions.cancel()
+
+
+# ------------------- What-if Scenarios -------------------
+class ScenarioGrid(BaseModel):
+    # Values per slider; the sweep covers every combination. Omitted sliders stay at the base value.
+    target_year: List[TargetYear] | None = None
+    amount: List[float] | None = None
+    expenses: List[float] | None = None
+    risk_profile: List[Literal["Low", "Medium", "High"]] | None = None
+
+
+class Scenario(BaseModel):
+    target_year: TargetYear | None = None
+    amount: float | None = None
+    expenses: float | None = None
+    risk_profile: Literal["Low", "Medium", "High"] | None = None
+
+
+class ScenarioRequest(BaseModel):
+    base: AdvisorInput
+    goal: int = 0  # index into base.goals
+    grid: ScenarioGrid | None = None
+    scenarios: List[Scenario] | None = Field(None, max_length=MAX_SCENARIOS)
+
+    @model_validator(mode="after")
+    def _check(self):
+        if not 0 <= self.goal < len(self.base.goals):
+            raise ValueError(f"goal must index one of the {len(self.base.goals)} goals in base")
+        if self.grid is not None and self.scenarios is not None:
+            raise ValueError("Send either grid or scenarios, not both")
+        if self.grid is not None:
+            count = int(np.prod([len(getattr(self.grid, axis) or [None]) for axis in AXES]))
+            if count > MAX_SCENARIOS:
+                raise ValueError(f"grid has {count} combinations; at most {MAX_SCENARIOS} are allowed")
+        return self
+
+
+# Sensitivity surface for one goal: its monthly saving, projected value,
+# feasibility and model recommendation for every slider combination, from array
+# math and one model call. The response is a table of columns, one entry per
+# scenario; grids are ordered with the last slider (risk_profile) varying fastest.
+# The sweep runs on a worker thread behind the same admission gate as /advisor.
+@app.post("/advisor/scenarios")
+async def advisor_scenarios(payload: ScenarioRequest):
+    user = payload.base.user
+    goal = payload.base.goals[payload.goal]
+    base = {
+        "target_year": goal.target_year,
+        "amount": goal.amount,
+        "expenses": user.expenses,
+        "risk_profile": DEFAULT_RISK_PROFILE,
+    }
+    if payload.scenarios is not None:
+        columns = list_columns(base, [s.model_dump(exclude_none=True) for s in payload.scenarios])
+    else:
+        columns = grid_columns(base, payload.grid.model_dump(exclude_none=True) if payload.grid else {})
+    count = len(columns["target_year"])
+    REQUEST_ITEMS.observe(count, kind="scenarios")
+
+    try:
+        async with admission.admit("/advisor/scenarios"):
+            result = await run_in_threadpool(sweep, user, goal, columns, datetime.datetime.now().year)
+    except Overloaded as e:
+        raise overloaded(e)
+    return ORJSONResponse({"goal": goal.name, "count": count, **result})
+
+
+# ------------------- Goal Classification -------------------
+class GoalDescriptions(BaseModel):
+    descriptions: List[str] = Field(max_length=GOAL_CLASSIFY_MAX_ITEMS)
+
+
+# Bulk labelling for onboarding imports: one vectorized model call for every
+# uncached description. Results are in input order.
+@app.post("/classify-goals")
+def classify_goals(payload: GoalDescriptions):
+    REQUEST_ITEMS.observe(len(payload.descriptions), kind="descriptions")
+    with registry.pinned() as version:
+        # Imports are mostly one-off phrases; keep them out of the shared LRU
+        labels = classify_goal_descriptions(payload.descriptions, remember=False)
+    return {
+        "model_version": version.version,
+        "results": [{"label": int(label), "goal": goal_categories.get(int(label))} for label in labels],
+    }
+
+
+# ------------------- Batch Route -------------------
+# Accepts a JSON array of AdvisorInput payloads, or one payload per line with
+# Content-Type: application/x-ndjson. Streams back one NDJSON line per user, in
+# input order: {"index": i, ...advisor response} or {"index": i, "error": ...}.
+# Bodies over BATCH_MAX_BYTES or BATCH_MAX_RECORDS are rejected with a 413.
+@app.post("/advisor/batch")
+async def get_advice_batch(
+    request: Request,
+    response_format: Literal["text", "structured"] = Query("text", alias="format"),
+):
+    body = await read_body(request, BATCH_MAX_BYTES)
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        # Lines are validated one by one, so a malformed line only fails its own record
+        records = [line for line in body.splitlines() if line.strip()]
+    else:
+        try:
+            records = orjson.loads(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+        if not isinstance(records, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array of advisor payloads")
+    if len(records) > BATCH_MAX_RECORDS:
+        raise HTTPException(
+            status_code=413, detail=f"Batch has {len(records)} records; at most {BATCH_MAX_RECORDS} are allowed",
+        )
+
+    return StreamingResponse(_stream_batch(records, response_format), media_type="application/x-ndjson")
+
+
+async def read_body(request, max_bytes):
+    # request.body(), but stops reading (413) as soon as the upload passes max_bytes
+    too_large = HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > max_bytes:
+        raise too_large
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise too_large
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# Same options as ORJSONResponse, one line per record
+NDJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+
+
+def _stream_batch(records, response_format="text"):
+    # Sync generator: Starlette iterates it in the thread pool, one chunk at a time
+    for start in range(0, len(records), BATCH_CHUNK_SIZE):
+        yield _score_chunk(records[start:start + BATCH_CHUNK_SIZE], start, response_format)
+
+
+def _score_chunk(records, start, response_format="text"):
+    # Returns the NDJSON lines for one chunk; the chunk's goals share one model call
+    lines = [None] * len(records)
+    valid, profiles = [], []
+    for i, record in enumerate(records):
+        try:
+            payload = parse_advisor_input(record)
+        except (ValidationError, ValueError) as e:
+            lines[i] = {"error": str(e)}
+            continue
+        valid.append(i)
+        profiles.append((payload.user, payload.goals, payload.investments, payload.insurance))
+
+    results = generate_advice_batch(profiles, structured=response_format == "structured")
+    for i, profile, result in zip(valid, profiles, results):
+        if isinstance(result, Exception):
+            lines[i] = {"error": str(result)}
+        else:
+            lines[i] = advisor_response(profile[0], result, response_format)
+
+    return b"".join(
+        orjson.dumps({"index": start + i, **line}, option=NDJSON_OPTIONS)
+        for i, line in enumerate(lines)
+    )
 
@@ -0,0 +1,13 @@
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# ----------------- Memory Usage ------------------
+# Shared by the offline CLIs (train.py, score.py) so neither has to import the other.
+def peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
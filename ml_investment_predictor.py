@@ -1,11 +1,30 @@
-import joblib
-import pandas as pd
-from goal_classifier import classify_goal_description
+import logging
+import os
+import threading
+import numpy as np
+from goal_classifier import classify_goal_descriptions
+from lookup_table import PredictionTable, SPEC_FILE
+from metrics import register_collector, stage
+from model_registry import registry
+from prediction_store import WARM_FROM, history_inputs, prediction_cache
+from tree_ensemble import CompiledEnsemble, compile_model
 
+logger = logging.getLogger(__name__)
 
-# Load model and encoders
-model = joblib.load("xgb_investment_model.pkl")
-encoders = joblib.load("xgb_label_encoders.pkl")
+# "native" runs the XGBoost booster; "compiled" evaluates the same trees with NumPy;
+# "table" reads precomputed predictions (lookup_table.py), native for rows off the grid
+# or in cells the table can't answer reliably
+INFERENCE_ENGINE = os.environ.get("INFERENCE_ENGINE", "native")
+if INFERENCE_ENGINE not in ("native", "compiled", "table"):
+    raise ValueError(f"Unknown INFERENCE_ENGINE: {INFERENCE_ENGINE}")
+
+# Refuse a prediction table whose recorded agreement with the exact model (on the training
+# rows) is below this. Unstable cells already fall back to the model, so only the stable
+# cells' misses count against it; the default grid builds at ~99.6% with the shipped model.
+TABLE_MIN_AGREEMENT = float(os.environ.get("PREDICTION_TABLE_MIN_AGREEMENT", "0.95"))
+
+# Booster threads per process; unset keeps XGBoost's default
+INFERENCE_THREADS = os.environ.get("INFERENCE_THREADS")
 
 risk_mapping = {"Low": 0, "Medium": 1, "High": 2}
 goal_mapping = {
@@ -18,28 +37,245 @@ goal_mapping = {
     "Travel Abroad": 6
 }
 
+# Column order the XGBoost model was trained on
+FEATURE_COLUMNS = ["age", "salary", "savings", "risk_profile", "goal", "goal_amount", "years_to_goal"]
+
 def predict_instrument(user_input):
-    # Encode input manually
-    risk_encoded = risk_mapping[user_input["risk_profile"]]
-    goal_encoded = classify_goal_description(user_input["goal"])
+    return predict_instruments_batch([user_input])[0]
+
+def predict_instruments_batch(user_inputs):
+    # One classifier transform + one booster pass for every goal in the request
+    if not user_inputs:
+        return []
+
+    # Classifier, model and encoders all come from one version, even across a hot reload
+    with registry.pinned():
+        return _predict_batch(user_inputs)
+
+def _predict_batch(user_inputs):
+    goal_encoded = classify_goal_descriptions([u["goal"] for u in user_inputs])
+
+    with stage("predict_instrument"):
+        features = encode_inputs(user_inputs, goal_encoded)
+
+        # Rows seen before (by this worker, or by any worker sharing PREDICTION_STORE) skip the model
+        pred, confidences = prediction_cache.predict(cache_model_key(), features, predict_encoded)
+
+        # Same as LabelEncoder.inverse_transform without its validation; argmax indices are always in range
+        predicted_labels = instrument_classes()[pred]
+
+    return list(zip(predicted_labels, confidences))
+
+def encode_inputs(user_inputs, goal_encoded):
+    # predict_instruments_batch inputs + their goal codes -> float64 features in FEATURE_COLUMNS order
+    return np.column_stack([
+        [u["age"] for u in user_inputs],
+        [u["salary"] for u in user_inputs],
+        [u["savings"] for u in user_inputs],
+        [risk_mapping[u["risk_profile"]] for u in user_inputs],
+        goal_encoded,
+        [u["goal_amount"] for u in user_inputs],
+        [u["years_to_goal"] for u in user_inputs],
+    ]).astype(np.float64)
+
+def cache_model_key():
+    # Cached predictions are only valid for the artifact version and engine that produced them
+    return f"{registry.current().version}:{INFERENCE_ENGINE}"
+
+def predict_encoded(features):
+    # features: 2-D array in FEATURE_COLUMNS order -> (class index, confidence %) arrays
+    if INFERENCE_ENGINE == "table":
+        return _predict_table(features)
+    # Label and confidence both come from the argmax of a single predict_proba
+    prob = predict_proba(features)
+    pred = prob.argmax(axis=1)
+    return pred, np.round(prob[np.arange(len(pred)), pred] * 100, 1)
+
+def instrument_classes():
+    # Instrument names indexed by predict_encoded's class index
+    return registry.get("label_encoders")['selected_instrument'].classes_
+
+def _predict_table(features):
+    pred, confidences, in_grid = registry.get("prediction_table").lookup(features)
+    misses = ~in_grid
+    if misses.any():
+        prob = predict_proba(features[misses])
+        pred[misses] = prob.argmax(axis=1)
+        confidences[misses] = np.round(prob[np.arange(len(prob)), pred[misses]] * 100, 1)
+    _count_table_rows(int(in_grid.sum()), int(misses.sum()))
+    return pred, confidences
+
+def predict_proba(features):
+    # features: 2-D array in FEATURE_COLUMNS order
+    if INFERENCE_ENGINE == "compiled":
+        return registry.get("compiled_investment_model").predict_proba(features)
+    return registry.get("investment_model").predict_proba(features)
+
+
+# ----------------- Model Loading ------------------
+def _check_feature_order(version):
+    # Manifests written by train.py record the column order the model was fit on
+    feature_order = version.manifest.get("feature_order", FEATURE_COLUMNS)
+    if feature_order != FEATURE_COLUMNS:
+        raise ValueError(f"Artifact feature order {feature_order} does not match serving order {FEATURE_COLUMNS}")
+
+def _load_investment_model(version):
+    if version.manifest:
+        _check_feature_order(version)
+        from xgboost import XGBClassifier
+        model = XGBClassifier()
+        model.load_model(version.path("xgb_investment_model.ubj"))
+    else:
+        import joblib
+        model = joblib.load("xgb_investment_model.pkl")
+    if INFERENCE_THREADS:
+        model.set_params(n_jobs=int(INFERENCE_THREADS))
+    return model
+
+def _load_compiled_model(version):
+    if version.manifest:
+        _check_feature_order(version)
+        return CompiledEnsemble.from_json(version.path("xgb_investment_model.json"))
+    return compile_model(version.get("investment_model"))
+
+def _load_prediction_table(version):
+    if not os.path.exists(version.path(SPEC_FILE)):
+        raise ValueError(f"No prediction table in {version.directory}; build one with python lookup_table.py")
+    table = PredictionTable.load(version.directory)
+    if "stable" not in table.cells.dtype.names:
+        raise ValueError("Prediction table has no per-cell stability flags; rebuild it with python lookup_table.py")
+    if table.spec["model_version"] != version.version:
+        raise ValueError(
+            f"Prediction table was built for {table.spec['model_version']}, not {version.version}; rebuild it"
+        )
+    classes = version.get("label_encoders")["selected_instrument"].classes_.tolist()
+    if table.classes != classes:
+        raise ValueError("Prediction table classes do not match the label encoder")
+    agreement = table.spec["agreement"]["agreement"]
+    if agreement < TABLE_MIN_AGREEMENT:
+        raise ValueError(
+            f"Prediction table agreement {agreement:.1%} is below PREDICTION_TABLE_MIN_AGREEMENT "
+            f"({TABLE_MIN_AGREEMENT:.1%}); build a finer grid (lookup_table.py --bins) or use INFERENCE_ENGINE=native"
+        )
+    logger.info("Prediction table: %s cells, %.1f%% agreement", table.spec["cells"], agreement * 100)
+    return table
+
+def _load_label_encoders(version):
+    if version.manifest:
+        from sklearn.preprocessing import LabelEncoder
+        encoders = {}
+        with np.load(version.path("xgb_label_encoders.npz")) as arrays:
+            for name in arrays.files:
+                encoders[name] = LabelEncoder()
+                encoders[name].classes_ = arrays[name]
+        return encoders
+    import joblib
+    return joblib.load("xgb_label_encoders.pkl")
+
+def _warm_up():
+    predict_instrument({
+        "age": 30,
+        "salary": 50000,
+        "savings": 100000,
+        "risk_profile": "High",
+        "goal": "Retirement",
+        "goal_amount": 1000000,
+        "years_to_goal": 10
+    })
+
+def warm_prediction_store(path, force=False, cache=prediction_cache):
+    # Scores a history CSV into the shared prediction store for the current version
+    user_inputs = history_inputs(path)
+    with registry.pinned():
+        features = encode_inputs(user_inputs, classify_goal_descriptions([u["goal"] for u in user_inputs], remember=False))
+        return cache.warm(cache_model_key(), features, predict_encoded, os.path.basename(path), force=force)
+
+def _warm_prediction_store():
+    result = warm_prediction_store(WARM_FROM)
+    logger.info("Prediction store warm-up: %s", result)
+
+# Smoke set for hot reloads: one row per goal at a few ages, incomes and horizons
+SMOKE_INPUTS = [
+    {
+        "age": age, "salary": salary, "savings": salary * 5, "risk_profile": "High",
+        "goal": goal, "goal_amount": salary * 40, "years_to_goal": years,
+    }
+    for goal in goal_mapping
+    for age, salary, years in ((25, 30000, 5), (40, 90000, 15), (55, 150000, 3))
+]
+
+# Refuse a new version whose smoke predictions agree with the serving one less often than this.
+# A retrain moves a few of the smoke rows; one that changes most of them is more likely broken
+# than better. 0 accepts any in-range predictions.
+MIN_RELOAD_AGREEMENT = float(os.environ.get("MODEL_RELOAD_MIN_AGREEMENT", "0.5"))
+
+def _validate(candidate, active):
+    with registry.pinned(candidate):
+        predicted = predict_instruments_batch(SMOKE_INPUTS)
+    classes = set(candidate.get("label_encoders")["selected_instrument"].classes_.tolist())
+    for label, confidence in predicted:
+        if label not in classes or not 0 <= confidence <= 100:
+            raise ValueError(f"Smoke prediction out of range: {label!r} at {confidence}%")
+
+    with registry.pinned(active):
+        baseline = predict_instruments_batch(SMOKE_INPUTS)
+    agreement = sum(a[0] == b[0] for a, b in zip(predicted, baseline)) / len(SMOKE_INPUTS)
+    if agreement < MIN_RELOAD_AGREEMENT:
+        raise ValueError(
+            f"Smoke agreement {agreement:.0%} is below MODEL_RELOAD_MIN_AGREEMENT ({MIN_RELOAD_AGREEMENT:.0%})"
+        )
+    return {"smoke_rows": len(SMOKE_INPUTS), "smoke_agreement": round(agreement, 4)}
+
+# Table mode keeps the booster loaded for rows that fall outside the grid
+registry.register("investment_model", _load_investment_model, required=INFERENCE_ENGINE in ("native", "table"))
+registry.register("compiled_investment_model", _load_compiled_model, required=INFERENCE_ENGINE == "compiled")
+registry.register("prediction_table", _load_prediction_table, required=INFERENCE_ENGINE == "table")
+registry.register("label_encoders", _load_label_encoders)
+registry.register_warmup(_warm_up)
+if WARM_FROM:
+    registry.register_warmup(_warm_prediction_store)
+registry.register_validator(_validate)
+
 
+# Goal rows answered from the prediction table vs sent to the exact model
+_table_rows = {"table": 0, "fallback": 0}
+_table_lock = threading.Lock()
 
-    input_df = pd.DataFrame([{
-        "age": user_input["age"],
-        "salary": user_input["salary"],
-        "savings": user_input["savings"],
-        "risk_profile": risk_encoded,
-        "goal": goal_encoded,
-        "goal_amount": user_input["goal_amount"],
-        "years_to_goal": user_input["years_to_goal"]
-    }])
+def _count_table_rows(hits, fallbacks):
+    with _table_lock:
+        _table_rows["table"] += hits
+        _table_rows["fallback"] += fallbacks
 
-    # Predict with confidence
-    pred = model.predict(input_df)
-    prob = model.predict_proba(input_df)
+def table_stats():
+    table = registry.peek("prediction_table")
+    with _table_lock:
+        rows = dict(_table_rows)
+    return {
+        "rows": rows,
+        "cells": table.spec["cells"] if table else None,
+        "agreement": table.spec["agreement"] if table else None,
+    }
 
-    predicted_label = encoders['selected_instrument'].inverse_transform(pred)[0]
-    confidence = round(prob[0][pred[0]] * 100, 1)
+@register_collector
+def _table_metrics():
+    if INFERENCE_ENGINE != "table":
+        return
+    stats = table_stats()
+    yield "prediction_table_rows_total", "counter", "Goal rows by where their prediction came from", [
+        ({"source": source}, count) for source, count in stats["rows"].items()
+    ]
+    if stats["agreement"]:
+        yield "prediction_table_agreement", "gauge", "Table vs exact model label agreement on the training CSV", [
+            ({}, stats["agreement"]["agreement"])
+        ]
 
-    return predicted_label, confidence
 
+def __getattr__(name):
+    # Backwards-compatible module attributes, resolved through the registry
+    if name == "model":
+        return registry.get("investment_model")
+    if name == "encoders":
+        return registry.get("label_encoders")
+    if name == "compiled_model":
+        return registry.get("compiled_investment_model")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
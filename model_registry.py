@@ -0,0 +1,342 @@
+import contextvars
+import gc
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# Directory written by export_artifacts.py / train.py; falls back to the joblib pickles when absent
+ARTIFACT_DIR = os.environ.get("MODEL_ARTIFACT_DIR", "artifacts")
+MANIFEST_FILE = "manifest.json"
+
+# Joblib fallbacks, fingerprinted by size/mtime when there is no manifest
+PICKLE_FILES = ("xgb_investment_model.pkl", "xgb_label_encoders.pkl", "goal_classifier.pkl", "goal_vectorizer.pkl")
+
+# "1" defers loading to first use / the background warm-up instead of blocking startup
+LAZY_LOAD = os.environ.get("MODEL_LAZY_LOAD", "0") == "1"
+
+# Poll the active artifact directory every N seconds and hot-reload on change; 0 disables
+WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+
+
+def artifact_path(name, directory=None):
+    return os.path.join(directory or ARTIFACT_DIR, name)
+
+
+def read_manifest(directory=None):
+    path = artifact_path(MANIFEST_FILE, directory)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def artifact_version(manifest):
+    # Short digest identifying the artifacts a process serves; changes whenever a model file does
+    if manifest:
+        parts = sorted(manifest["files"].items())
+    else:
+        parts = [
+            (name, os.stat(name).st_size, os.stat(name).st_mtime_ns) for name in PICKLE_FILES if os.path.exists(name)
+        ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:16]
+
+
+def verify_checksums(directory, manifest):
+    # Catches a directory that is still being written (or was tampered with) before we load it
+    for name, expected in manifest["files"].items():
+        with open(artifact_path(name, directory), "rb") as f:
+            if hashlib.sha256(f.read()).hexdigest() != expected:
+                raise ValueError(f"Checksum mismatch for {name} in {directory}")
+
+
+# ----------------- Model Versions ------------------
+# One artifact directory's models, loaded lazily through the registered loaders.
+# Requests pin the version they started on, so a swap never mixes two versions
+# within one prediction; a replaced version unloads once its last pin is released.
+class ModelVersion:
+    def __init__(self, directory, loaders):
+        self.directory = directory
+        self.manifest = read_manifest(directory)
+        self.version = artifact_version(self.manifest)
+        self._loaders = loaders
+        self._models = {}
+        self._lock = threading.RLock()
+        self.timings = {}
+        self.warmed_up = False
+        self.in_flight = 0
+        self.retired = False  # unloaded after draining; never pinned again
+
+    def path(self, name):
+        return artifact_path(name, self.directory)
+
+    def get(self, name):
+        try:
+            return self._models[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._models:
+                started = time.perf_counter()
+                self._models[name] = self._loaders[name](self)
+                self.timings[f"load.{name}"] = round(time.perf_counter() - started, 4)
+            return self._models[name]
+
+    def peek(self, name):
+        # Loaded model or None; never triggers a load
+        return self._models.get(name)
+
+    def loaded(self, names):
+        return {name: name in self._models for name in names}
+
+    def unload(self):
+        with self._lock:
+            self._models.clear()
+
+
+class _Pin:
+    __slots__ = ("registry", "version", "token")
+
+    def __init__(self, registry, version):
+        self.registry = registry
+        self.version = version  # None: whatever is current when the pin is entered
+
+    def __enter__(self):
+        self.version = self.registry._acquire(self.version)
+        self.token = self.registry._pinned.set(self.version)
+        return self.version
+
+    def __exit__(self, *exc_info):
+        self.registry._pinned.reset(self.token)
+        self.registry._release(self.version)
+        return False
+
+
+# ----------------- Model Registry ------------------
+# Every model artifact is loaded through here, once per version, on first use
+# (or by load_all at startup), with per-artifact load timings for /healthz.
+# reload() loads, warms and validates a new version off to the side, then
+# swaps it in with a single assignment.
+class ModelRegistry:
+    def __init__(self, directory=ARTIFACT_DIR):
+        self._loaders = {}
+        self._required = []
+        self._warmups = []
+        self._validators = []
+        self._lock = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._pin_lock = threading.Lock()
+        self._pinned = contextvars.ContextVar("model_version", default=None)
+        self.timings = {}
+        self.active = ModelVersion(directory, self._loaders)
+        self.draining = []
+        self.reloads = {"success": 0, "failed": 0}
+        self.last_reload = None
+
+    # The active version's details, for callers that predate versioning
+    @property
+    def manifest(self):
+        return self.active.manifest
+
+    @property
+    def version(self):
+        return self.active.version
+
+    @property
+    def warmed_up(self):
+        return self.active.warmed_up
+
+    def register(self, name, loader, required=True):
+        # loader(version) -> model; read files through version.path() and version.manifest
+        self._loaders[name] = loader
+        if required:
+            self._required.append(name)
+
+    def register_warmup(self, fn):
+        self._warmups.append(fn)
+
+    def register_validator(self, fn):
+        # fn(candidate, active) -> dict of smoke-test stats; raise to reject the candidate
+        self._validators.append(fn)
+
+    def current(self):
+        return self._pinned.get() or self.active
+
+    def pinned(self, version=None):
+        # Nested pins keep the outer version; the version is resolved and pinned in one
+        # step on entry, so a concurrent reload can't retire it in between
+        return _Pin(self, version)
+
+    def get(self, name):
+        return self.current().get(name)
+
+    def peek(self, name):
+        return self.current().peek(name)
+
+    def load_all(self):
+        for name in self._required:
+            self.get(name)
+
+    def warm_up(self):
+        # One real inference per registered hook, so the first request doesn't pay
+        # for thread pools, caches and lazily-imported code paths
+        with self._lock:
+            version = self.active
+            if version.warmed_up:
+                return
+            self._prepare(version)
+
+    def _prepare(self, version):
+        with self.pinned(version):
+            for name in self._required:
+                version.get(name)
+            started = time.perf_counter()
+            for fn in self._warmups:
+                fn()
+            version.timings["warm_up"] = round(time.perf_counter() - started, 4)
+        version.warmed_up = True
+
+    def reload(self, directory=None):
+        # Load + warm + validate a version in this thread, then swap it in; requests keep
+        # being served by the old version until the swap, and finish on it after
+        with self._reload_lock:
+            directory = directory or self.active.directory
+            started = time.perf_counter()
+            try:
+                candidate = ModelVersion(directory, self._loaders)
+                same_directory = os.path.abspath(directory) == os.path.abspath(self.active.directory)
+                if candidate.version == self.active.version and same_directory:
+                    return {"status": "unchanged", "version": candidate.version}
+                if candidate.manifest:
+                    verify_checksums(directory, candidate.manifest)
+                self._prepare(candidate)
+                smoke = {}
+                for fn in self._validators:
+                    smoke.update(fn(candidate, self.active))
+            except Exception as e:
+                self.reloads["failed"] += 1
+                self.last_reload = {"status": "failed", "directory": directory, "error": str(e), "at": time.time()}
+                logger.exception("Model reload from %s failed", directory)
+                raise
+
+            # Under the pin lock too: an unpinned request resolves and pins either the old
+            # version (which then drains) or the new one, never a version being retired
+            with self._lock, self._pin_lock:
+                previous, self.active = self.active, candidate
+                self.draining.append(previous)
+            self._retire_drained()
+
+            self.reloads["success"] += 1
+            self.last_reload = {
+                "status": "swapped",
+                "directory": directory,
+                "version": candidate.version,
+                "previous_version": previous.version,
+                "seconds": round(time.perf_counter() - started, 4),
+                "smoke": smoke,
+                "at": time.time(),
+            }
+            logger.info("Model version %s -> %s", previous.version, candidate.version)
+            return self.last_reload
+
+    def watch(self, interval=WATCH_INTERVAL):
+        # Background poll of the active directory's manifest (or pickles); any change reloads
+        if interval <= 0:
+            return None
+
+        def run():
+            failed_version = None
+            while True:
+                time.sleep(interval)
+                version = None
+                try:
+                    version = artifact_version(read_manifest(self.active.directory))
+                    if version != self.active.version and version != failed_version:
+                        self.reload()
+                except Exception:
+                    # Don't retry the same broken artifacts every poll
+                    failed_version = version
+
+        thread = threading.Thread(target=run, name="model-watcher", daemon=True)
+        thread.start()
+        return thread
+
+    def _acquire(self, version=None):
+        # -> the pinned version: the given one, else the outer pin's, else the active one
+        with self._pin_lock:
+            if version is None:
+                version = self._pinned.get() or self.active
+            if version.retired:
+                raise RuntimeError(f"Model version {version.version} has been retired")
+            version.in_flight += 1
+            return version
+
+    def _release(self, version):
+        with self._pin_lock:
+            version.in_flight -= 1
+            drained = version.in_flight == 0 and version in self.draining
+        if drained:
+            self._retire_drained()
+
+    def _retire_drained(self):
+        with self._pin_lock:
+            retired = [v for v in self.draining if v.in_flight == 0]
+            self.draining = [v for v in self.draining if v.in_flight > 0]
+            for version in retired:
+                version.retired = True
+        for version in retired:
+            version.unload()
+        if retired:
+            # Models hold large reference cycles (sklearn/xgboost wrappers); free them now
+            gc.collect()
+
+    def record_timing(self, name, seconds):
+        self.timings[name] = round(seconds, 4)
+
+    def loaded(self):
+        return self.active.loaded(self._required)
+
+    def ready(self):
+        return self.warmed_up and all(self.loaded().values())
+
+    def status(self):
+        active = self.active
+        return {
+            "ready": self.ready(),
+            "lazy_load": LAZY_LOAD,
+            "artifact_format": "native" if active.manifest else "pickle",
+            "artifact_dir": active.directory,
+            "artifact_version": active.version,
+            "models": self.loaded(),
+            "timings": {**self.timings, **active.timings},
+            "draining": [{"version": v.version, "in_flight": v.in_flight} for v in self.draining],
+            "reloads": dict(self.reloads),
+            "last_reload": self.last_reload,
+        }
+
+
+registry = ModelRegistry()
+
+
+@register_collector
+def _registry_metrics():
+    status = registry.status()
+    yield "model_ready", "gauge", "1 when every model is loaded and warmed up", [({}, int(status["ready"]))]
+    yield "model_load_seconds", "gauge", "Import, load and warm-up timings", [
+        ({"step": name}, seconds) for name, seconds in status["timings"].items()
+    ]
+    yield "model_version_info", "gauge", "Artifact version currently serving", [
+        ({"version": status["artifact_version"]}, 1)
+    ]
+    yield "model_reloads_total", "counter", "Hot reload attempts", [
+        ({"result": result}, count) for result, count in status["reloads"].items()
+    ]
+    yield "model_versions_draining", "gauge", "Replaced versions still serving in-flight work", [
+        ({}, len(status["draining"]))
+    ]
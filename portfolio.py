@@ -0,0 +1,113 @@
+import os
+from collections import namedtuple
+from operator import attrgetter
+
+import numpy as np
+
+from domain import InvestmentColumns
+
+# Holdings lists at least this long are aggregated with numpy; shorter ones are faster in one plain loop
+VECTORIZE_MIN_HOLDINGS = int(os.environ.get("PORTFOLIO_VECTORIZE_MIN_HOLDINGS", "64"))
+
+# Allocation lists longer than this keep their N largest rows and roll the rest into "Other"; 0 disables.
+# Well above the instrument catalogue, so only imported statements with many distinct funds are capped
+ALLOCATION_TOP_N = int(os.environ.get("ADVISOR_ALLOCATION_TOP_N", "25"))
+
+# Holdings under this name are insurance premiums, reported separately from investments
+INSURANCE = "Insurance"
+
+
+# ----------------- Portfolio Aggregation ------------------
+# Everything the investment rules need, from one pass over the holdings:
+#   instrument_count  distinct instrument names, Insurance included
+#   invested          total of the non-Insurance holdings
+#   allocation        {instrument: total}, Insurance excluded, first-appearance order
+#   class_totals      {asset class: total} over every holding, first-appearance order
+# Both paths add amounts in holding order, so totals match a plain Python sum exactly.
+Portfolio = namedtuple("Portfolio", ["instrument_count", "invested", "allocation", "class_totals"])
+
+
+def aggregate_portfolio(investments, asset_class_of):
+    # investments: Investment rows or InvestmentColumns (domain.py)
+    columnar = isinstance(investments, InvestmentColumns)
+    if len(investments) < VECTORIZE_MIN_HOLDINGS:
+        if columnar:
+            holdings = zip(investments.instrument_name, investments.amount)
+        else:
+            holdings = ((inv.instrument_name, inv.amount) for inv in investments)
+        return _aggregate_loop(holdings, asset_class_of)
+
+    if columnar:
+        names = np.array(investments.instrument_name, dtype=object)
+        amounts = np.array(investments.amount, dtype=np.float64)
+    else:
+        # Pulling the two fields out of the objects is most of the cost; map + fromiter is the cheapest way
+        count = len(investments)
+        names = np.fromiter(list(map(_instrument_name, investments)), dtype=object, count=count)
+        amounts = np.fromiter(list(map(_amount, investments)), dtype=np.float64, count=count)
+    return _aggregate_vectorized(names, amounts, asset_class_of)
+
+
+def _aggregate_loop(holdings, asset_class_of):
+    # holdings: (instrument name, amount) pairs
+    invested = 0
+    allocation = {}
+    class_totals = {}
+    has_insurance = False
+    for name, amount in holdings:
+        category = asset_class_of.get(name)
+        if category is not None:
+            class_totals[category] = class_totals.get(category, 0.0) + amount
+        if name == INSURANCE:
+            has_insurance = True
+            continue
+        invested += amount
+        allocation[name] = allocation.get(name, 0.0) + amount
+    return Portfolio(len(allocation) + has_insurance, invested, allocation, class_totals)
+
+
+_instrument_name = attrgetter("instrument_name")
+_amount = attrgetter("amount")
+
+
+def _aggregate_vectorized(names, amounts, asset_class_of):
+    # Instruments become integer codes (first-appearance order) and every total is a bincount.
+    # A dict factorize rather than pandas', so pandas stays off the serving import path.
+    names = names.tolist()
+    index = {name: code for code, name in enumerate(dict.fromkeys(names))}
+    codes = np.fromiter(map(index.__getitem__, names), dtype=np.int64, count=len(names))
+    names = list(index)
+    totals = np.bincount(codes, weights=amounts, minlength=len(names)).tolist()
+
+    insurance = names.index(INSURANCE) if INSURANCE in names else -1
+    invested_amounts = amounts[codes != insurance] if insurance >= 0 else amounts
+    # cumsum adds sequentially, like sum(); np.sum's pairwise order could differ in the last bit
+    invested = float(np.cumsum(invested_amounts)[-1]) if len(invested_amounts) else 0
+    allocation = {name: total for code, (name, total) in enumerate(zip(names, totals)) if code != insurance}
+
+    classes = {}
+    class_of_code = np.array(
+        [classes.setdefault(asset_class_of[name], len(classes)) if name in asset_class_of else -1 for name in names],
+        dtype=np.int64,
+    )
+    class_codes = class_of_code[codes]
+    classified = class_codes >= 0
+    class_sums = np.bincount(class_codes[classified], weights=amounts[classified], minlength=len(classes)).tolist()
+    class_totals = dict(zip(classes, class_sums))
+    return Portfolio(len(names), invested, allocation, class_totals)
+
+
+def allocation_rows(allocation, total, top_n=ALLOCATION_TOP_N):
+    # ([{"name", "percent"}], rolled_up): one row per entry in order, or past top_n entries
+    # the top_n largest (still in order) plus "Other" for the rolled_up remainder
+    if top_n <= 0 or len(allocation) <= top_n:
+        return [{"name": name, "percent": (amount / total) * 100} for name, amount in allocation.items()], 0
+
+    names = list(allocation)
+    amounts = np.fromiter(allocation.values(), dtype=np.float64, count=len(names))
+    keep = np.sort(np.argpartition(-amounts, top_n - 1)[:top_n])
+    rest = np.ones(len(names), dtype=bool)
+    rest[keep] = False
+    rows = [{"name": names[i], "percent": (allocation[names[i]] / total) * 100} for i in keep.tolist()]
+    rows.append({"name": "Other", "percent": (float(amounts[rest].sum()) / total) * 100})
+    return rows, int(rest.sum())
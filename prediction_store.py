@@ -0,0 +1,398 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import register_collector
+
+# In-process tier: most recent feature rows per worker; 0 disables it
+MEMORY_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "4096"))
+
+# Shared tier: a SQLite file (WAL mode) every worker on the host reads and writes, and
+# which survives restarts; unset disables it. Rows past the limit are evicted least recently used first.
+STORE_PATH = os.environ.get("PREDICTION_STORE", "")
+STORE_MAX_ROWS = int(os.environ.get("PREDICTION_STORE_MAX_ROWS", "1000000"))
+
+# History CSV (user_goal_dataset_3000.csv layout) scored into the shared tier when a model
+# version warms up; each version is warmed from a given file once per host
+WARM_FROM = os.environ.get("PREDICTION_STORE_WARM_FROM", "")
+
+# Seconds a writer waits on another worker's transaction before giving up on the write
+BUSY_TIMEOUT = 0.05
+
+# A hit refreshes its row's eviction timestamp at most this often, so reads rarely write
+TOUCH_INTERVAL = 60
+
+# Inserted rows between size checks; eviction trims to EVICT_TO of the limit
+EVICT_CHECK_EVERY = 1024
+EVICT_TO = 0.9
+
+# Keys per SELECT ... IN (...), under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+# Shared-tier failures that fall back to the model (locked database, unwritable directory, full disk)
+STORE_ERRORS = (sqlite3.Error, OSError)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    confidence_dtype TEXT NOT NULL,
+    warmed_from TEXT,
+    warmed_rows INTEGER
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    model TEXT NOT NULL,
+    features BLOB NOT NULL,
+    label INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    used INTEGER NOT NULL,
+    PRIMARY KEY (model, features)
+);
+CREATE INDEX IF NOT EXISTS predictions_used ON predictions (used);
+"""
+
+
+# ----------------- Prediction Cache ------------------
+# predict_encoded results for exact feature vectors, in two tiers: a per-process
+# LRU, then a SQLite file shared by every worker on the host. Keys are the
+# model key (artifact version + inference engine) and the raw float64 bytes of
+# the 7 features in FEATURE_COLUMNS order, so a hit is always the answer the
+# same model gave for the same row; a reload simply starts missing. The class
+# index and confidence are stored, with the confidence cast back to the dtype
+# the model returned so cached and computed answers serialize identically.
+# Lookups and writes that fail on the shared tier (locked, disk full) fall
+# through to the model and are counted; they never fail a request.
+class MemoryTier:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # (model, features) -> (label, confidence)
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def get_many(self, model, keys):
+        # -> {key: (label, confidence)} for the keys held
+        found = {}
+        with self.lock:
+            for key in keys:
+                value = self.entries.get((model, key))
+                if value is not None:
+                    self.entries.move_to_end((model, key))
+                    found[key] = value
+        return found
+
+    def put_many(self, model, values):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            for key, value in values.items():
+                self.entries[(model, key)] = value
+                self.entries.move_to_end((model, key))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+
+class SharedTier:
+    def __init__(self, path, max_rows):
+        self.path = path
+        self.max_rows = max_rows
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.inserted_since_check = 0
+        self.rows = None  # counted at each size check, estimated in between
+        self.evictions = 0
+
+    def connection(self):
+        # One connection per thread and process: sqlite3 connections can't cross either,
+        # and serve.py forks its workers after import
+        conn = getattr(self.local, "conn", None)
+        if conn is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self.local.conn, self.local.pid = conn, os.getpid()
+        return conn
+
+    def model_info(self, model):
+        # -> (confidence dtype, warmed_from) recorded for model, or None before its first write
+        row = self.connection().execute(
+            "SELECT confidence_dtype, warmed_from FROM models WHERE model = ?", (model,)
+        ).fetchone()
+        return (np.dtype(row[0]), row[1]) if row else None
+
+    def get_many(self, model, keys):
+        conn = self.connection()
+        found, stale = {}, []
+        now = int(time.time())
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start:start + LOOKUP_CHUNK]
+            rows = conn.execute(
+                f"SELECT features, label, confidence, used FROM predictions WHERE model = ? AND features IN ({','.join('?' * len(chunk))})",
+                (model, *chunk),
+            ).fetchall()
+            for key, label, confidence, used in rows:
+                found[key] = (label, confidence)
+                if used < now - TOUCH_INTERVAL:
+                    stale.append(key)
+        if stale:
+            try:
+                with conn:
+                    conn.executemany(
+                        "UPDATE predictions SET used = ? WHERE model = ? AND features = ?",
+                        [(now, model, key) for key in stale],
+                    )
+            except sqlite3.OperationalError:
+                pass  # busy: the row just looks older to eviction
+        return found
+
+    def put_many(self, model, values, dtype):
+        now = int(time.time())
+        conn = self.connection()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO models (model, confidence_dtype) VALUES (?, ?)", (model, dtype.str)
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                [(model, key, label, confidence, now) for key, (label, confidence) in values.items()],
+            )
+        with self.lock:
+            self.inserted_since_check += len(values)
+            if self.rows is not None:
+                self.rows += len(values)  # replaced rows make this an upper bound until the next check
+            check = self.inserted_since_check >= EVICT_CHECK_EVERY or self.rows is None
+            if check:
+                self.inserted_since_check = 0
+        if check:
+            self.evict(conn)
+
+    def evict(self, conn):
+        rows = conn.execute("SELECT count(*) FROM predictions").fetchone()[0]
+        if self.max_rows > 0 and rows > self.max_rows:
+            excess = rows - int(self.max_rows * EVICT_TO)
+            with conn:
+                conn.execute(
+                    "DELETE FROM predictions WHERE rowid IN (SELECT rowid FROM predictions ORDER BY used LIMIT ?)",
+                    (excess,),
+                )
+            rows -= excess
+            with self.lock:
+                self.evictions += excess
+        with self.lock:
+            self.rows = rows
+
+    def mark_warmed(self, model, source, rows):
+        conn = self.connection()
+        with conn:
+            conn.execute("UPDATE models SET warmed_from = ?, warmed_rows = ? WHERE model = ?", (source, rows, model))
+
+    def stats(self):
+        with self.lock:
+            return {"path": self.path, "max_rows": self.max_rows, "rows": self.rows, "evictions": self.evictions}
+
+
+class PredictionCache:
+    def __init__(self, memory_size=MEMORY_SIZE, path=STORE_PATH, max_rows=STORE_MAX_ROWS):
+        self.memory = MemoryTier(memory_size) if memory_size > 0 else None
+        self.shared = SharedTier(path, max_rows) if path else None
+        self.lock = threading.Lock()
+        self.dtypes = {}  # model -> confidence dtype, from its first computed or shared answer
+        self.hits = {"memory": 0, "shared": 0}
+        self.misses = {"memory": 0, "shared": 0}
+        self.errors = 0
+
+    def predict(self, model, features, compute):
+        # features: 2-D float64 array; compute(features) -> (class index, confidence) arrays.
+        # Returns the same as compute(features), scoring only the rows no tier holds.
+        if (self.memory is None and self.shared is None) or not len(features):
+            return compute(features)
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        keys = [row.tobytes() for row in features]
+        missing = list(dict.fromkeys(keys))
+        found = {}
+
+        if self.memory is not None:
+            found = self.memory.get_many(model, missing)
+            missing = self._record("memory", found, missing)
+
+        if missing and self.shared is not None:
+            try:
+                shared = self.shared.get_many(model, missing)
+                if shared and model not in self.dtypes:
+                    self.dtypes[model] = self.shared.model_info(model)[0]
+            except STORE_ERRORS:
+                shared = {}
+                self._error()
+            missing = self._record("shared", shared, missing)
+            if shared and self.memory is not None:
+                self.memory.put_many(model, shared)
+            found.update(shared)
+
+        if missing:
+            computed, dtype = self._compute(features.shape[1], missing, compute)
+            self.dtypes.setdefault(model, dtype)
+            if self.memory is not None:
+                self.memory.put_many(model, computed)
+            self._write_shared(model, computed, dtype)
+            found.update(computed)
+
+        pred = np.fromiter((found[key][0] for key in keys), dtype=np.intp, count=len(keys))
+        confidences = np.fromiter((found[key][1] for key in keys), dtype=self.dtypes[model], count=len(keys))
+        return pred, confidences
+
+    def warm(self, model, features, compute, source, force=False):
+        # Scores history rows into the shared tier only (this worker's LRU is left alone).
+        # Once a model has been warmed from source, other workers and restarts skip it.
+        if self.shared is None:
+            return {"status": "disabled"}
+        try:
+            info = self.shared.model_info(model)
+            if info is not None and info[1] == source and not force:
+                return {"status": "already_warm", "model": model, "source": source}
+            keys = list(dict.fromkeys(row.tobytes() for row in np.ascontiguousarray(features, dtype=np.float64)))
+            held = self.shared.get_many(model, keys)
+        except STORE_ERRORS:
+            self._error()
+            return {"status": "error", "model": model}
+        missing = [key for key in keys if key not in held]
+        if missing:
+            computed, dtype = self._compute(features.shape[1], missing, compute)
+            if not self._write_shared(model, computed, dtype):
+                return {"status": "error", "model": model}
+        try:
+            self.shared.mark_warmed(model, source, len(keys))
+        except STORE_ERRORS:
+            self._error()
+        return {"status": "warmed", "model": model, "source": source, "rows": len(keys), "scored": len(missing)}
+
+    def _compute(self, width, keys, compute):
+        rows = np.frombuffer(b"".join(keys), dtype=np.float64).reshape(len(keys), width)
+        pred, confidences = compute(rows)
+        confidences = np.asarray(confidences)
+        return dict(zip(keys, zip(np.asarray(pred).tolist(), confidences.tolist()))), confidences.dtype
+
+    def _write_shared(self, model, values, dtype):
+        if self.shared is None:
+            return False
+        try:
+            self.shared.put_many(model, values, dtype)
+            return True
+        except STORE_ERRORS:
+            self._error()
+            return False
+
+    def _record(self, tier, found, keys):
+        # -> the keys this tier didn't hold
+        with self.lock:
+            self.hits[tier] += len(found)
+            self.misses[tier] += len(keys) - len(found)
+        return [key for key in keys if key not in found]
+
+    def _error(self):
+        with self.lock:
+            self.errors += 1
+
+    def stats(self):
+        with self.lock:
+            tiers = {}
+            for tier in ("memory", "shared"):
+                lookups = self.hits[tier] + self.misses[tier]
+                tiers[tier] = {
+                    "hits": self.hits[tier],
+                    "misses": self.misses[tier],
+                    "hit_rate": round(self.hits[tier] / lookups, 4) if lookups else 0,
+                }
+            errors = self.errors
+        if self.memory is not None:
+            with self.memory.lock:
+                tiers["memory"].update(maxsize=self.memory.maxsize, entries=len(self.memory.entries), evictions=self.memory.evictions)
+        else:
+            tiers["memory"]["enabled"] = False
+        if self.shared is not None:
+            tiers["shared"].update(self.shared.stats())
+        else:
+            tiers["shared"]["enabled"] = False
+        return {**tiers, "errors": errors}
+
+
+prediction_cache = PredictionCache()
+
+
+@register_collector
+def _prediction_cache_metrics():
+    stats = prediction_cache.stats()
+    yield "prediction_cache_hits_total", "counter", "Goal rows answered by a prediction cache tier", [
+        ({"tier": tier}, stats[tier]["hits"]) for tier in ("memory", "shared")
+    ]
+    yield "prediction_cache_misses_total", "counter", "Goal rows a prediction cache tier didn't hold", [
+        ({"tier": tier}, stats[tier]["misses"]) for tier in ("memory", "shared")
+    ]
+    yield "prediction_cache_hit_ratio", "gauge", "Hits / lookups per prediction cache tier since start", [
+        ({"tier": tier}, stats[tier]["hit_rate"]) for tier in ("memory", "shared")
+    ]
+    yield "prediction_cache_evictions_total", "counter", "Prediction cache entries evicted by size limits", [
+        ({"tier": tier}, stats[tier]["evictions"]) for tier in ("memory", "shared") if "evictions" in stats[tier]
+    ]
+    yield "prediction_cache_entries", "gauge", "Prediction cache entries (shared: estimated between size checks)", [
+        ({"tier": tier}, stats[tier][key]) for tier, key in (("memory", "entries"), ("shared", "rows"))
+        if stats[tier].get(key) is not None
+    ]
+    yield "prediction_cache_errors_total", "counter", "Shared prediction store reads/writes that failed", [
+        ({}, stats["errors"])
+    ]
+
+
+# ----------------- Warm-up ------------------
+def history_inputs(path):
+    # History CSV (user_goal_dataset_3000.csv layout) -> predict_instruments_batch inputs
+    with open(path, newline="", encoding="utf-8") as f:
+        return [
+            {
+                "age": float(row["age"]),
+                "salary": float(row["salary"]),
+                "savings": float(row["savings"]),
+                "risk_profile": row["risk_profile"],
+                "goal": row["goal"],
+                "goal_amount": float(row["goal_amount"]),
+                "years_to_goal": float(row["years_to_goal"]),
+            }
+            for row in csv.DictReader(f)
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the shared prediction store from a history CSV")
+    parser.add_argument("--data", default="user_goal_dataset_3000.csv", help="history CSV to score")
+    parser.add_argument("--store", default=STORE_PATH, help="SQLite file (default: PREDICTION_STORE)")
+    parser.add_argument("--force", action="store_true", help="re-score even if this model was warmed from --data")
+    parser.add_argument("--stats", action="store_true", help="only print the store's row count")
+    args = parser.parse_args()
+    if not args.store:
+        raise SystemExit("No store: set PREDICTION_STORE or pass --store")
+
+    cache = PredictionCache(0, args.store, STORE_MAX_ROWS)
+    if args.stats:
+        cache.shared.evict(cache.shared.connection())
+        print(json.dumps(cache.stats()["shared"], indent=2))
+        return
+
+    # The active artifacts (MODEL_ARTIFACT_DIR) with the serving INFERENCE_ENGINE
+    from ml_investment_predictor import warm_prediction_store
+
+    started = time.perf_counter()
+    result = warm_prediction_store(args.data, force=args.force, cache=cache)
+    print(json.dumps({**result, "seconds": round(time.perf_counter() - started, 2)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
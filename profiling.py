@@ -0,0 +1,220 @@
+import cProfile
+import json
+import os
+import pstats
+import random
+import re
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+from metrics import register_collector
+
+# Fraction of /advisor cache misses to profile; 0 leaves only forced profiles
+# (X-Profile: 1 together with a valid X-Admin-Token)
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+
+# Ring of the most recent profiles on disk: one .prof (pstats) and one .json (request shape, top functions) each.
+# Under serve.py every worker writes into the same directory; 0 keeps everything.
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+MAX_PROFILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+
+# Functions kept in each profile's summary
+TOP_FUNCTIONS = 20
+
+SORT_KEYS = ("tottime", "cumtime", "calls")
+STDLIB_DIR = sysconfig.get_paths()["stdlib"] + os.sep
+PROFILE_ID = re.compile(r"[0-9T]+-[0-9]+-[0-9]+-[0-9]+")
+
+
+# ----------------- Request Profiling ------------------
+# cProfile only while a sampled request runs its synchronous sections. cProfile
+# follows the thread that enables it, so /advisor enters the profile on the worker
+# thread doing its CPU work and other requests never land in it; callers must not
+# await inside `with profile:`. The same profile can be entered several times and adds up.
+class RequestProfile:
+    def __init__(self, profile_id, reason):
+        self.id = profile_id
+        self.reason = reason
+        self.captured_at = time.time()
+        self.profiler = cProfile.Profile()
+        self.seconds = 0.0
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.disable()
+        self.seconds += time.perf_counter() - self._started
+
+
+def _function_name(func):
+    # (file, line, name) -> "name (file:line)", site-packages, stdlib and cwd prefixes dropped
+    filename, line, name = func
+    if filename == "~":
+        return name  # builtins, e.g. "<method 'argsort' of 'numpy.ndarray' objects>"
+    if "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    elif filename.startswith(STDLIB_DIR):
+        filename = filename[len(STDLIB_DIR):]
+    elif filename.startswith(os.getcwd() + os.sep):
+        filename = os.path.relpath(filename)
+    return f"{name} ({filename}:{line})"
+
+
+def top_functions(stats, sort="tottime", top=TOP_FUNCTIONS):
+    # stats: pstats.Stats -> [{"function", "calls", "tottime_ms", "cumtime_ms"}], hottest first
+    rows = [
+        {"function": _function_name(func), "calls": calls, "tottime_ms": tottime * 1000, "cumtime_ms": cumtime * 1000}
+        for func, (_, calls, tottime, cumtime, _) in stats.stats.items()
+    ]
+    key = {"tottime": "tottime_ms", "cumtime": "cumtime_ms", "calls": "calls"}[sort]
+    rows.sort(key=lambda row: row[key], reverse=True)
+    for row in rows[:top]:
+        row["tottime_ms"] = round(row["tottime_ms"], 3)
+        row["cumtime_ms"] = round(row["cumtime_ms"], 3)
+    return rows[:top]
+
+
+class ProfileStore:
+    def __init__(self, directory, max_profiles, sample_rate):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.sample_rate = sample_rate
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.captured = Counter()
+        self.write_errors = 0
+
+    def sample(self, forced=False):
+        # -> a RequestProfile to run the request under, or None (the common case)
+        if not forced and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+        now = time.time()
+        # Sorts by capture time across workers: timestamp, milliseconds, pid, per-process sequence
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}-{int(now * 1000) % 1000:03d}-{os.getpid()}-{sequence}"
+        return RequestProfile(profile_id, "forced" if forced else "sampled")
+
+    def path(self, profile_id, suffix):
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, profile, shape, **extra):
+        # Runs after the response is sent (a BackgroundTask); a full disk only costs the profile
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.profiler.dump_stats(self.path(profile.id, ".prof"))
+            meta = {
+                "id": profile.id,
+                "captured_at": profile.captured_at,
+                "reason": profile.reason,
+                "duration_ms": round(profile.seconds * 1000, 3),
+                **extra,
+                "shape": shape,
+                "top": top_functions(pstats.Stats(profile.profiler)),
+            }
+            with open(self.path(profile.id, ".json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            with self.lock:
+                self.captured[profile.reason] += 1
+            self._prune()
+        except OSError:
+            with self.lock:
+                self.write_errors += 1
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-5] for name in names if name.endswith(".json") and PROFILE_ID.fullmatch(name[:-5]))
+
+    def _prune(self):
+        if self.max_profiles <= 0:
+            return
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - self.max_profiles)]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(self.path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass  # another worker pruned it first
+
+    def recent(self, limit=50):
+        # Newest first, without the per-profile function lists
+        entries = []
+        for profile_id in reversed(self._ids()):
+            meta = self.get(profile_id)
+            if meta is None:
+                continue
+            meta.pop("top", None)
+            entries.append(meta)
+            if len(entries) >= limit:
+                break
+        return entries
+
+    def get(self, profile_id):
+        if not PROFILE_ID.fullmatch(profile_id):
+            return None
+        try:
+            with open(self.path(profile_id, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def stats_file(self, profile_id):
+        path = self.path(profile_id, ".prof")
+        return path if PROFILE_ID.fullmatch(profile_id) and os.path.exists(path) else None
+
+    def aggregate(self, limit=100, sort="tottime", top=30, min_duration_ms=0):
+        # Hot functions summed over the newest `limit` profiles (optionally only the slow ones)
+        stats, used, total_ms = None, 0, 0.0
+        for meta in self.recent(limit):
+            if meta["duration_ms"] < min_duration_ms:
+                continue
+            path = self.stats_file(meta["id"])
+            if path is None:
+                continue
+            try:
+                if stats is None:
+                    stats = pstats.Stats(path)
+                else:
+                    stats.add(path)
+            except (OSError, EOFError, ValueError):
+                continue
+            used += 1
+            total_ms += meta["duration_ms"]
+        return {
+            "profiles": used,
+            "total_duration_ms": round(total_ms, 3),
+            "sort": sort,
+            "functions": top_functions(stats, sort, top) if stats is not None else [],
+        }
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "directory": self.directory,
+                "max_profiles": self.max_profiles,
+                "captured": dict(self.captured),
+                "write_errors": self.write_errors,
+            }
+
+
+profile_store = ProfileStore(PROFILE_DIR, MAX_PROFILES, SAMPLE_RATE)
+
+
+@register_collector
+def _profiling_metrics():
+    stats = profile_store.stats()
+    yield "advisor_profiles_captured_total", "counter", "/advisor requests profiled and written to disk", [
+        ({"reason": reason}, count) for reason, count in stats["captured"].items()
+    ]
+    yield "advisor_profile_write_errors_total", "counter", "Profiles lost to disk errors", [({}, stats["write_errors"])]
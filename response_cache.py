@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+from metrics import register_collector
+from model_registry import registry
+
+# Bounded by entry count and by total body bytes; size 0 disables storage (ETags still work)
+RESPONSE_CACHE_SIZE = int(os.environ.get("ADVISOR_RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("ADVISOR_RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.environ.get("ADVISOR_RESPONSE_CACHE_TTL", "300"))
+
+
+# ----------------- Response Cache ------------------
+# /advisor output is a pure function of the validated payload, the current
+# year, the loaded artifacts and the metadata tables, so the key hashes exactly
+# those. The payload is hashed in a canonical serialization (sorted keys,
+# coerced values), so key order and whitespace in the request don't matter.
+# The same key doubles as the ETag. When the artifact version or any watched
+# table changes, every entry is dropped.
+class ResponseCache:
+    def __init__(self, maxsize, max_bytes, ttl):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, body)
+        self.bytes = 0
+        self.tables = {}
+        self.tables_digest = b""
+        self.fingerprint = None
+        self.fingerprint_of = None  # (model version, tables digest) it was computed from
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def watch(self, **tables):
+        # Metadata the advice depends on, hashed here rather than per lookup: after editing
+        # a watched table at runtime, pass it to watch() again to flush the cache
+        self.tables.update(tables)
+        self.tables_digest = hashlib.sha256(json.dumps(self.tables, sort_keys=True, default=str).encode()).digest()
+
+    def current_fingerprint(self):
+        # Recomputed (and the cache flushed) only when the model version or the tables change
+        source = (registry.version, self.tables_digest)
+        if source != self.fingerprint_of:
+            with self.lock:
+                if source != self.fingerprint_of:
+                    if self.fingerprint is not None:
+                        self.invalidations += 1
+                    self.entries.clear()
+                    self.bytes = 0
+                    self.fingerprint = hashlib.sha256(source[0].encode() + source[1]).hexdigest()[:16]
+                    self.fingerprint_of = source
+        return self.fingerprint
+
+    def key(self, payload, current_year, variant=""):
+        # payload: the validated AdvisorInput; variant: anything else that shapes the response, e.g. the format
+        digest = hashlib.sha256()
+        digest.update(f"{self.current_fingerprint()}:{current_year}:{variant}:".encode())
+        digest.update(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
+        return digest.hexdigest()[:32]
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, body = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if self.maxsize <= 0 or len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, body)
+            self.bytes += len(body)
+            while len(self.entries) > self.maxsize or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self.lock:
+            self.not_modified += 1
+
+    def _remove(self, key):
+        _, body = self.entries.pop(key)
+        self.bytes -= len(body)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+
+
+@register_collector
+def _response_cache_metrics():
+    stats = response_cache.stats()
+    yield "advisor_response_cache_hits_total", "counter", "/advisor responses served from the cache", [({}, stats["hits"])]
+    yield "advisor_response_cache_misses_total", "counter", "/advisor response cache misses", [({}, stats["misses"])]
+    yield "advisor_response_not_modified_total", "counter", "/advisor 304 responses", [({}, stats["not_modified"])]
+    yield "advisor_response_cache_evictions_total", "counter", "Entries evicted by size limits", [({}, stats["evictions"])]
+    yield "advisor_response_cache_expirations_total", "counter", "Entries dropped after their TTL", [({}, stats["expirations"])]
+    yield "advisor_response_cache_invalidations_total", "counter", "Full flushes after a model or metadata change", [
+        ({}, stats["invalidations"])
+    ]
+    yield "advisor_response_cache_entries", "gauge", "Cached /advisor responses", [({}, stats["entries"])]
+    yield "advisor_response_cache_bytes", "gauge", "Bytes held by cached /advisor responses", [({}, stats["bytes"])]
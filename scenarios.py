@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+
+from ai_advisor import GOAL_RETURN_RATE
+from goal_classifier import classify_goal_descriptions
+from metrics import stage
+from ml_investment_predictor import instrument_classes, predict_encoded, risk_mapping
+from model_registry import registry
+
+# Most scenarios one /advisor/scenarios call may evaluate (grid product or list length)
+MAX_SCENARIOS = int(os.environ.get("ADVISOR_SCENARIOS_MAX", "10000"))
+
+# Sliders a scenario can move, in grid order (the last one varies fastest)
+AXES = ("target_year", "amount", "expenses", "risk_profile")
+
+# /advisor scores every goal as this risk profile; scenarios default to it too
+DEFAULT_RISK_PROFILE = "High"
+
+
+# ----------------- What-if Sweep ------------------
+# The goal-planning math of one goal for many variations of its target year,
+# amount, the user's monthly expenses and the risk profile, all as array
+# operations: monthly saving needed, projected value and feasibility exactly as
+# the goal_planning rule computes them, plus the model's instrument and
+# confidence from one predict call over the distinct feature rows. The other
+# advice sections don't move with these sliders, so they aren't recomputed.
+def grid_columns(base, grid):
+    # base: {axis: value}; grid: {axis: [values]} -> {axis: array}, the cartesian product
+    axes = [np.asarray(grid.get(axis) or [base[axis]]) for axis in AXES]
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return {axis: values.ravel() for axis, values in zip(AXES, mesh)}
+
+
+def list_columns(base, scenarios):
+    # scenarios: [{axis: value}] with unset axes taken from base -> {axis: array}
+    return {axis: np.asarray([s.get(axis, base[axis]) for s in scenarios]) for axis in AXES}
+
+
+def sweep(user, goal, columns, current_year):
+    # -> {column: array or list}, one entry per scenario, in input order
+    years = columns["target_year"].astype(np.int64) - current_year
+    amount = columns["amount"].astype(np.float64)
+    monthly_savings = user.salary - columns["expenses"].astype(np.float64)
+    active = years > 0
+
+    # Same float operations, in the same order, as _goal_planning
+    months = np.where(active, years * 12, 1)
+    needed = np.where(active, (amount - goal.saved_amount) / months, np.nan)
+    rate = GOAL_RETURN_RATE / 12
+    # Growth per distinct horizon with Python's pow: numpy's can differ from it in the last bit
+    horizons, horizon_index = np.unique(months, return_inverse=True)
+    annuity = np.array([((1 + rate) ** int(m) - 1) / rate for m in horizons])
+    projected = needed * annuity[horizon_index] * (1 + rate)
+
+    feasibility = np.select(
+        [~active, needed > user.salary, needed > monthly_savings],
+        ["target_passed", "infeasible", "over_budget"],
+        "feasible",
+    )
+
+    instrument = np.full(len(years), None, dtype=object)
+    confidence = np.full(len(years), np.nan)
+    model_version = None
+    if active.any():
+        risk = np.array([risk_mapping[r] for r in columns["risk_profile"][active].tolist()], dtype=np.float64)
+        # Only risk, amount and horizon vary between model rows (expenses don't reach the model),
+        # so score each distinct combination once; mixed-radix codes keep the dedup one 1-D unique
+        key = np.zeros(len(risk), dtype=np.int64)
+        for values in (risk, amount[active], years[active]):
+            distinct, codes = np.unique(values, return_inverse=True)
+            key = key * len(distinct) + codes
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+        rows = len(first)
+
+        with registry.pinned() as version:
+            model_version = version.version
+            goal_code = classify_goal_descriptions([goal.name])[0]
+            features = np.column_stack([
+                np.full(rows, user.age, dtype=np.float64),
+                np.full(rows, user.salary, dtype=np.float64),
+                np.full(rows, user.savings, dtype=np.float64),
+                risk[first],
+                np.full(rows, goal_code, dtype=np.float64),
+                amount[active][first],
+                years[active][first].astype(np.float64),
+            ])
+            with stage("predict_instrument"):
+                pred, scores = predict_encoded(features)
+            scores = np.asarray(scores)
+            instrument[active] = instrument_classes()[pred][inverse]
+            # The model's own dtype (float32 for the booster), so values serialize as /advisor's do
+            confidence = confidence.astype(scores.dtype)
+            confidence[active] = scores[inverse]
+
+    return {
+        "model_version": model_version,
+        "columns": {
+            "target_year": columns["target_year"].astype(np.int64),
+            "amount": amount,
+            "expenses": columns["expenses"].astype(np.float64),
+            "risk_profile": columns["risk_profile"].tolist(),
+            "years_left": years,
+            "monthly_saving": needed,
+            "projected_value": projected,
+            "feasibility": feasibility.tolist(),
+            "instrument": instrument.tolist(),
+            "confidence": confidence,
+        },
+    }
@@ -0,0 +1,246 @@
+import argparse
+import collections
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+# ----------------- Bulk Scoring ------------------
+# Offline predict_instrument for every (customer, goal) row of large CSVs in the
+# user_goal_dataset_3000.csv layout. The input is streamed in chunks; each
+# chunk's distinct goal texts go through the goal classifier once, and the
+# encoded float32 feature matrix is scored by a pool of worker processes while
+# the next chunk is read. Results are written incrementally and in input order,
+# so memory stays bounded by chunk size x in-flight chunks, whatever the input size.
+#
+#   python score.py customers.csv --output scored.csv
+#   python score.py 'exports/part-*.csv' --output scored.parquet --workers 8
+#   INFERENCE_ENGINE=table python score.py big.csv --output out.csv --keep-columns customer_id,goal
+#
+# Output: the input columns (or --keep-columns) plus recommended_instrument and
+# confidence. Rows with an unknown risk_profile or no goal are kept with both empty.
+
+THREADS = os.environ.get("INFERENCE_THREADS", "1")
+
+# Thread pools size themselves at import time, so this must run before numpy/xgboost load
+os.environ["INFERENCE_THREADS"] = THREADS
+for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(var, THREADS)
+
+import numpy as np
+import pandas as pd
+
+from goal_classifier import classify_goal_descriptions
+from memory_usage import peak_memory_mb
+from ml_investment_predictor import FEATURE_COLUMNS, instrument_classes, predict_encoded, risk_mapping
+from model_registry import registry
+
+# Strings become categoricals; numeric columns keep pandas' lossless int64/float64 for the pass-through
+CSV_DTYPES = {"risk_profile": "category", "goal": "category"}
+NUMERIC_FEATURES = ["age", "salary", "savings", "goal_amount", "years_to_goal"]
+
+# Seconds between progress lines on stderr
+PROGRESS_INTERVAL = 5.0
+
+
+# ----------------- Encoding ------------------
+class ChunkEncoder:
+    # Feature matrix for one chunk. Goal labels are cached per distinct text across chunks,
+    # so the classifier only ever sees each description once.
+    def __init__(self):
+        self.goal_labels = {}
+
+    def goal_codes(self, goals):
+        categories = [str(c) for c in goals.cat.categories]
+        new = [c for c in categories if c not in self.goal_labels]
+        if new:
+            # remember=False: one-off campaign texts shouldn't churn the serving cache's LRU
+            self.goal_labels.update(zip(new, classify_goal_descriptions(new, remember=False).tolist()))
+        lookup = np.array([self.goal_labels[c] for c in categories] + [np.nan], dtype=np.float32)
+        return lookup[goals.cat.codes.to_numpy()]
+
+    def encode(self, chunk):
+        # -> (float32 matrix in FEATURE_COLUMNS order, mask of scorable rows)
+        columns = {name: chunk[name].to_numpy(dtype=np.float32, na_value=np.nan) for name in NUMERIC_FEATURES}
+        risk = chunk["risk_profile"]
+        risk_lookup = np.array([risk_mapping.get(c, np.nan) for c in risk.cat.categories] + [np.nan], dtype=np.float32)
+        columns["risk_profile"] = risk_lookup[risk.cat.codes.to_numpy()]
+        columns["goal"] = self.goal_codes(chunk["goal"])
+        X = np.column_stack([columns[name] for name in FEATURE_COLUMNS])
+        valid = ~np.isnan(columns["risk_profile"]) & ~np.isnan(columns["goal"])
+        return X, valid
+
+
+def read_chunks(paths, chunk_rows):
+    for path in paths:
+        yield from pd.read_csv(path, dtype=CSV_DTYPES, chunksize=chunk_rows)
+
+
+# ----------------- Workers ------------------
+def _init_worker():
+    # Models are already loaded when the pool forks; spawn-based platforms load them here
+    registry.load_all()
+
+
+def score_features(X):
+    # Runs in a worker: (class index, confidence %) per row, in compact dtypes for the trip back
+    with registry.pinned():
+        pred, confidence = predict_encoded(X)
+    return pred.astype(np.int16), np.asarray(confidence, dtype=np.float32)
+
+
+def _run_inline(fn, *args):
+    future = Future()
+    future.set_result(fn(*args))
+    return future
+
+
+# ----------------- Writers ------------------
+class CsvWriter:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.file, index=False, header=self.header)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    # One row group per chunk; needs pyarrow
+    def __init__(self, path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow (pip install pyarrow); or write .csv")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        # Categoricals as plain strings: per-chunk dictionaries would change the schema between row groups
+        for name in frame.columns:
+            if isinstance(frame[name].dtype, pd.CategoricalDtype):
+                frame[name] = frame[name].astype(object)
+        if self.writer is None:
+            table = self.pa.Table.from_pandas(frame, preserve_index=False)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = self.pa.Table.from_pandas(frame, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_writer(path, output_format):
+    output_format = output_format or ("parquet" if path.endswith((".parquet", ".pq")) else "csv")
+    return ParquetWriter(path) if output_format == "parquet" else CsvWriter(path)
+
+
+# ----------------- Driver ------------------
+def score_files(paths, output, output_format=None, chunk_rows=200000, workers=1, keep_columns=None, progress=True):
+    registry.load_all()
+    classes = instrument_classes()
+    encoder = ChunkEncoder()
+    writer = open_writer(output, output_format)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        submit = pool.submit
+    else:
+        submit = _run_inline
+
+    # Chunks waiting on their scores; bounded so reading can't run ahead of the workers
+    pending = collections.deque()
+    max_pending = max(2, workers * 2)
+    stats = {"rows": 0, "scored": 0, "skipped": 0, "chunks": 0}
+    started = last_report = time.perf_counter()
+
+    def write_next():
+        nonlocal last_report
+        chunk, valid, future = pending.popleft()
+        pred, confidence = future.result()
+        codes = np.full(len(chunk), -1, dtype=np.int16)
+        codes[valid] = pred
+        confidences = np.full(len(chunk), np.nan, dtype=np.float32)
+        confidences[valid] = confidence
+
+        out = chunk[keep_columns] if keep_columns else chunk
+        out = out.assign(
+            recommended_instrument=pd.Categorical.from_codes(codes, categories=classes),
+            confidence=confidences,
+        )
+        writer.write(out)
+
+        stats["rows"] += len(chunk)
+        stats["scored"] += int(valid.sum())
+        stats["skipped"] += int((~valid).sum())
+        stats["chunks"] += 1
+        now = time.perf_counter()
+        if progress and now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            print(
+                f"{stats['rows']:,} rows  {stats['rows'] / (now - started):,.0f} rows/s  "
+                f"{stats['chunks']} chunks  peak {peak_memory_mb()} MB",
+                file=sys.stderr, flush=True,
+            )
+
+    try:
+        for chunk in read_chunks(paths, chunk_rows):
+            X, valid = encoder.encode(chunk)
+            pending.append((chunk, valid, submit(score_features, X[valid])))
+            while len(pending) >= max_pending:
+                write_next()
+        while pending:
+            write_next()
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    seconds = time.perf_counter() - started
+    return {
+        **stats,
+        "distinct_goals": len(encoder.goal_labels),
+        "seconds": round(seconds, 2),
+        "rows_per_second": round(stats["rows"] / seconds) if seconds else None,
+        "workers": workers,
+        "chunk_rows": chunk_rows,
+        "inference_engine": os.environ.get("INFERENCE_ENGINE", "native"),
+        "model_version": registry.version,
+        "peak_memory_mb": peak_memory_mb(),
+        "output": output,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score instrument recommendations for large customer CSVs")
+    parser.add_argument("inputs", nargs="+", help="CSV files or glob patterns, in the user_goal_dataset layout")
+    parser.add_argument("--output", required=True, help=".csv or .parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="override the format implied by --output")
+    parser.add_argument("--chunk-rows", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="scoring processes (INFERENCE_THREADS threads each); 1 scores in-process")
+    parser.add_argument("--keep-columns", help="comma-separated input columns to copy to the output (default: all)")
+    parser.add_argument("--quiet", action="store_true", help="no progress lines")
+    args = parser.parse_args()
+
+    paths = sorted(p for pattern in args.inputs for p in (glob.glob(pattern) or [pattern]))
+    keep_columns = args.keep_columns.split(",") if args.keep_columns else None
+    report = score_files(
+        paths, args.output, args.format, args.chunk_rows, args.workers, keep_columns, progress=not args.quiet,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
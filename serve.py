@@ -0,0 +1,134 @@
+# ----------------- Pre-fork Server ------------------
+# Multi-process serving with models shared copy-on-write between workers.
+#
+# The master process imports the app and loads every model through the
+# registry, freezes the GC so collections in the workers don't write to the
+# shared object headers, binds the listening socket and then forks N workers.
+# Each worker runs its own uvicorn server on the inherited socket and only
+# pays for its own request-time allocations; the model pages stay shared.
+# Warm-up inference runs in each worker after the fork (OpenMP thread pools
+# are not fork-safe), and dead workers are respawned by the master.
+#
+# Settings (environment):
+#   WEB_CONCURRENCY      number of workers (default 1)
+#   HOST / PORT          bind address (default 0.0.0.0:10000)
+#   INFERENCE_THREADS    XGBoost/OpenMP/BLAS threads per worker (default 1 when forking
+#                        workers; a single worker keeps the libraries' own defaults)
+#
+# A worker that dies within RESPAWN_MIN_UPTIME of starting counts as a crash;
+# each consecutive crash doubles the wait before the next respawn (up to
+# RESPAWN_MAX_DELAY), so a worker that can't start doesn't fork in a tight loop.
+#
+# Measured memory (INFERENCE_ENGINE=native, native artifacts, INFERENCE_THREADS=1,
+# after 800 /advisor requests; RSS/PSS from /proc/<pid>/smaps_rollup):
+#
+#   mode                           per-worker RSS   per-worker PSS   total PSS
+#   4 independent uvicorn procs         205 MB           142 MB         568 MB
+#   serve.py, 4 workers                 141 MB            44 MB         277 MB
+#                                          (master: 200 MB RSS, 101 MB PSS)
+#
+# PSS splits shared pages between the processes mapping them, so it is the
+# real per-worker cost; RSS counts the shared model pages in every process.
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "10000"))
+# N workers with all-core thread pools each would oversubscribe the CPUs N times over
+THREADS = os.environ.get("INFERENCE_THREADS", "1" if WORKERS > 1 else None)
+
+RESPAWN_MIN_UPTIME = 10
+RESPAWN_MAX_DELAY = 30
+
+# Thread pools size themselves at import time, so this must run before numpy/xgboost load
+if THREADS:
+    os.environ["INFERENCE_THREADS"] = THREADS
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, THREADS)
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock):
+    import uvicorn
+
+    config = uvicorn.Config(app, lifespan="on", log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def spawn(app, sock):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            run_worker(app, sock)
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    from main import app
+    from model_registry import registry
+
+    # Load once in the master; workers inherit the pages copy-on-write
+    registry.load_all()
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(HOST, PORT)
+    if WORKERS <= 1:
+        run_worker(app, sock)
+        return
+
+    workers = {spawn(app, sock): time.monotonic() for _ in range(WORKERS)}  # pid -> started
+    shutting_down = False
+    crashes = 0
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if shutting_down or started is None:
+            continue
+        crashes = crashes + 1 if time.monotonic() - started < RESPAWN_MIN_UPTIME else 0
+        delay = min(RESPAWN_MAX_DELAY, 2 ** (crashes - 1)) if crashes else 0
+        print(f"Worker {pid} exited with status {status}; respawning in {delay}s", file=sys.stderr)
+        respawn_at = time.monotonic() + delay
+        while not shutting_down and time.monotonic() < respawn_at:
+            time.sleep(0.1)
+        if not shutting_down:
+            workers[spawn(app, sock)] = time.monotonic()
+
+
+if __name__ == "__main__":
+    main()
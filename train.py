@@ -0,0 +1,304 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from export_artifacts import export_goal_classifier, write_manifest
+from memory_usage import peak_memory_mb
+from ml_investment_predictor import FEATURE_COLUMNS, goal_mapping, risk_mapping
+from model_registry import ARTIFACT_DIR
+
+# ----------------- Training Pipeline ------------------
+# Replaces the training cells of p.ipynb. Reads the CSVs in chunks into compact
+# dtypes, trains the instrument model (XGBoost hist) and the goal classifier
+# (TF-IDF + LogisticRegression) and writes a versioned artifact directory in
+# the export_artifacts.py layout, so the registry serves it directly:
+#   python train.py
+#   python train.py --investment-data logs/part-*.csv --external-memory on
+#   MODEL_ARTIFACT_DIR=artifacts/versions/<version> python serve.py
+#
+# Categorical features are encoded with the serving mappings (risk_mapping,
+# goal_mapping), not the alphabetical LabelEncoder codes the notebook used, so
+# a trained model sees the same feature values at train and serve time.
+
+INVESTMENT_DATA = "user_goal_dataset_3000.csv"
+GOAL_DATA = "goal_training_data_v2.csv"
+VERSIONS_DIR = os.path.join(ARTIFACT_DIR, "versions")
+LABEL_COLUMN = "selected_instrument"
+NUMERIC_FEATURES = ["age", "salary", "savings", "goal_amount", "years_to_goal"]
+
+CSV_DTYPES = {
+    "age": "float32",
+    "salary": "float32",
+    "savings": "float32",
+    "risk_profile": "category",
+    "goal": "category",
+    "goal_amount": "float32",
+    "years_to_goal": "float32",
+    LABEL_COLUMN: "category",
+}
+
+# Notebook defaults: XGBClassifier(max_depth=6) with 100 rounds
+XGB_PARAMS = {
+    "objective": "multi:softprob",
+    "tree_method": "hist",
+    "max_depth": 6,
+    "eta": 0.3,
+    "eval_metric": ["mlogloss", "merror"],
+}
+
+
+def _map_categorical(column, mapping):
+    # Map each category once, then index by code; unknown values become NaN
+    lookup = np.array([mapping.get(c, np.nan) for c in column.cat.categories] + [np.nan], dtype=np.float32)
+    return lookup[column.cat.codes.to_numpy()]
+
+
+def encode_chunk(chunk):
+    # -> float32 feature matrix in FEATURE_COLUMNS order, label codes, label categories
+    columns = {name: chunk[name].to_numpy(dtype=np.float32) for name in NUMERIC_FEATURES}
+    columns["risk_profile"] = _map_categorical(chunk["risk_profile"], risk_mapping)
+    columns["goal"] = _map_categorical(chunk["goal"], goal_mapping)
+    X = np.column_stack([columns[name] for name in FEATURE_COLUMNS])
+
+    labels = chunk[LABEL_COLUMN]
+    known = ~np.isnan(X[:, [FEATURE_COLUMNS.index("risk_profile"), FEATURE_COLUMNS.index("goal")]]).any(axis=1)
+    known &= labels.cat.codes.to_numpy() >= 0
+    return X[known], labels.cat.codes.to_numpy()[known].astype(np.int32), list(labels.cat.categories), int((~known).sum())
+
+
+class ChunkStore:
+    # Encoded training chunks, in memory or spilled to .npy files for external-memory training.
+    # Labels are stored as chunk-local codes and mapped to the global class list on load.
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self.chunks = []
+        self.rows = 0
+
+    def append(self, X, codes, categories):
+        self.rows += len(X)
+        if self.spill_dir is None:
+            self.chunks.append((X, codes, categories))
+            return
+        path = os.path.join(self.spill_dir, f"chunk-{len(self.chunks):05d}")
+        np.save(path + "-X.npy", X)
+        np.save(path + "-y.npy", codes)
+        self.chunks.append((path, None, categories))
+
+    def load(self, index, classes):
+        X, codes, categories = self.chunks[index]
+        if self.spill_dir is not None:
+            X, codes = np.load(X + "-X.npy"), np.load(X + "-y.npy")
+        return X, np.searchsorted(classes, categories)[codes].astype(np.float32)
+
+    def __len__(self):
+        return len(self.chunks)
+
+
+def read_investment_data(paths, chunk_rows, store, valid_fraction, max_valid_rows, seed):
+    # One pass over the CSVs: encode each chunk, divert a random holdout to the validation set
+    rng = np.random.default_rng(seed)
+    valid_X, valid_codes, valid_categories = [], [], []
+    valid_rows = skipped = 0
+    for path in paths:
+        reader = pd.read_csv(path, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES, chunksize=chunk_rows)
+        for chunk in reader:
+            X, codes, categories, dropped = encode_chunk(chunk)
+            skipped += dropped
+            holdout = rng.random(len(X)) < valid_fraction
+            if valid_rows >= max_valid_rows:
+                holdout[:] = False
+            if holdout.any():
+                valid_X.append(X[holdout])
+                valid_codes.append(codes[holdout])
+                valid_categories.append(categories)
+                valid_rows += int(holdout.sum())
+            if (~holdout).any():
+                store.append(X[~holdout], codes[~holdout], categories)
+
+    classes = np.array(sorted({c for _, _, cats in store.chunks for c in cats} | {c for cats in valid_categories for c in cats}))
+    valid_y = [np.searchsorted(classes, cats)[codes] for codes, cats in zip(valid_codes, valid_categories)]
+    valid = (
+        np.concatenate(valid_X) if valid_X else np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32),
+        np.concatenate(valid_y).astype(np.float32) if valid_y else np.empty(0, dtype=np.float32),
+    )
+    return classes, valid, skipped
+
+
+def train_investment_model(args, out_dir):
+    import xgboost as xgb
+
+    class ChunkIter(xgb.DataIter):
+        def __init__(self, store, classes, cache_prefix=None):
+            self.store = store
+            self.classes = classes
+            self.index = 0
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self.index == len(self.store):
+                return False
+            X, y = self.store.load(self.index, self.classes)
+            input_data(data=X, label=y)
+            self.index += 1
+            return True
+
+        def reset(self):
+            self.index = 0
+
+    started = time.perf_counter()
+    external = args.external_memory == "on" or (
+        args.external_memory == "auto"
+        and sum(os.path.getsize(p) for p in args.investment_data) > args.memory_budget_mb * 1024 * 1024
+    )
+    spill_dir = tempfile.mkdtemp(prefix="train-chunks-") if external else None
+    dtrain = dvalid = evals = None
+    try:
+        store = ChunkStore(spill_dir)
+        classes, (valid_X, valid_y), skipped = read_investment_data(
+            args.investment_data, args.chunk_rows, store, args.valid_fraction, args.max_valid_rows, args.seed
+        )
+        if not store.rows:
+            raise ValueError("No usable training rows")
+
+        params = dict(XGB_PARAMS, num_class=len(classes), nthread=args.n_jobs, max_bin=args.max_bin, seed=args.seed)
+        it = ChunkIter(store, classes, cache_prefix=os.path.join(spill_dir, "cache") if external else None)
+        if external:
+            dtrain = xgb.ExtMemQuantileDMatrix(it, max_bin=args.max_bin)
+        else:
+            # Built straight from the chunks, without concatenating them first
+            dtrain = xgb.QuantileDMatrix(it, max_bin=args.max_bin)
+        evals = [(dtrain, "train")]
+        if len(valid_X):
+            dvalid = xgb.QuantileDMatrix(valid_X, label=valid_y, ref=dtrain)
+            evals.append((dvalid, "valid"))
+
+        history = {}
+        booster = xgb.train(
+            params, dtrain, num_boost_round=args.rounds, evals=evals, evals_result=history,
+            early_stopping_rounds=args.early_stopping if dvalid is not None else None, verbose_eval=False,
+        )
+        if dvalid is not None:
+            predicted = booster.predict(dvalid).argmax(axis=1)
+            accuracy = round(float((predicted == valid_y).mean()), 6)
+    finally:
+        # Free the matrices before their external-memory cache files go away
+        dtrain = dvalid = evals = it = None
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+    booster.save_model(os.path.join(out_dir, "xgb_investment_model.ubj"))
+    booster.save_model(os.path.join(out_dir, "xgb_investment_model.json"))
+    np.savez(os.path.join(out_dir, "xgb_label_encoders.npz"), **{LABEL_COLUMN: classes.astype(str)})
+
+    metrics = {split: {name: round(values[-1], 6) for name, values in series.items()} for split, series in history.items()}
+    if "valid" in metrics:
+        metrics["valid"]["accuracy"] = accuracy
+    return {
+        "classes": classes.tolist(),
+        "metrics": metrics,
+        "training": {
+            "rows": store.rows,
+            "valid_rows": int(len(valid_X)),
+            "skipped_rows": skipped,
+            "rounds": booster.num_boosted_rounds(),
+            "external_memory": external,
+            "params": params,
+            "seconds": round(time.perf_counter() - started, 3),
+        },
+    }
+
+
+def train_goal_classifier(args, out_dir):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    started = time.perf_counter()
+    df = pd.read_csv(args.goal_data, usecols=["goal_description", "label"], dtype={"goal_description": str, "label": "int8"})
+    # --valid-fraction 0 trains on every row and reports no validation metrics, like the instrument model
+    if args.valid_fraction > 0:
+        X_train, X_test, y_train, y_test = train_test_split(
+            df["goal_description"], df["label"], test_size=args.valid_fraction, random_state=args.seed
+        )
+    else:
+        X_train, X_test, y_train, y_test = df["goal_description"], df["goal_description"][:0], df["label"], df["label"][:0]
+    vectorizer = TfidfVectorizer()
+    model = LogisticRegression(max_iter=1000)
+    model.fit(vectorizer.fit_transform(X_train), y_train)
+    metrics = {}
+    if len(X_test):
+        accuracy = float((model.predict(vectorizer.transform(X_test)) == y_test.to_numpy()).mean())
+        metrics["valid"] = {"accuracy": round(accuracy, 6)}
+
+    vectorizer_params = export_goal_classifier(model, vectorizer, out_dir)
+    return vectorizer_params, {
+        "classes": model.classes_.tolist(),
+        "metrics": metrics,
+        "training": {"rows": len(X_train), "valid_rows": len(X_test), "seconds": round(time.perf_counter() - started, 3)},
+    }
+
+
+def valid_fraction(text):
+    value = float(text)
+    if not 0 <= value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 0 and below 1, got {text}")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the instrument model and goal classifier into a versioned artifact directory")
+    parser.add_argument("--investment-data", nargs="+", default=[INVESTMENT_DATA])
+    parser.add_argument("--goal-data", default=GOAL_DATA)
+    parser.add_argument("--version", help="defaults to a UTC timestamp")
+    parser.add_argument("--out", help=f"defaults to {VERSIONS_DIR}/<version>")
+    parser.add_argument("--chunk-rows", type=int, default=200_000)
+    parser.add_argument("--external-memory", choices=["auto", "on", "off"], default="auto",
+                        help="spill chunks to disk and train from an external-memory DMatrix")
+    parser.add_argument("--memory-budget-mb", type=int, default=2048,
+                        help="auto mode goes external when the input CSVs are larger than this")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--early-stopping", type=int)
+    parser.add_argument("--max-bin", type=int, default=256)
+    parser.add_argument("--valid-fraction", type=valid_fraction, default=0.2,
+                        help="share of rows held out for validation, in [0, 1); 0 skips validation")
+    parser.add_argument("--max-valid-rows", type=int, default=500_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    version = args.version or datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out_dir = args.out or os.path.join(VERSIONS_DIR, version)
+    os.makedirs(out_dir, exist_ok=True)
+
+    investment = train_investment_model(args, out_dir)
+    vectorizer_params, goal = train_goal_classifier(args, out_dir)
+
+    manifest = write_manifest(
+        out_dir,
+        vectorizer_params,
+        version=version,
+        feature_order=FEATURE_COLUMNS,
+        feature_encoding={"risk_profile": risk_mapping, "goal": goal_mapping},
+        classes={"selected_instrument": investment["classes"], "goal_classifier": goal["classes"]},
+        metrics={"investment_model": investment["metrics"], "goal_classifier": goal["metrics"]},
+        training={
+            "investment_model": investment["training"],
+            "goal_classifier": goal["training"],
+            "data": {"investment": args.investment_data, "goal": args.goal_data},
+            "seconds": round(time.perf_counter() - started, 3),
+            "peak_memory_mb": peak_memory_mb(),
+        },
+    )
+    print(json.dumps({"out": out_dir, "version": version, "metrics": manifest["metrics"], "training": manifest["training"]}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
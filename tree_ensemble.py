@@ -0,0 +1,169 @@
+import json
+import sys
+
+import numpy as np
+
+BLOCK_ROWS = 256
+
+# ----------------- Compiled Tree Ensemble ------------------
+# Flattens a multiclass XGBoost booster into array-backed node tables and
+# evaluates it with vectorized NumPy traversal: every tree advances one level
+# per step for all rows at once, so a single row costs ~max_depth array ops
+# instead of a DataFrame -> DMatrix -> booster round trip.
+class CompiledEnsemble:
+    def __init__(self, feature, threshold, left, right, default_left, value,
+                 roots, tree_class, n_classes, base_score, max_depth):
+        self.feature = feature            # split feature per node (0 for leaves)
+        self.threshold = threshold        # float32 split condition per node
+        self.left = left                  # global child ids; leaves point to themselves
+        self.right = right
+        self.default_left = default_left  # branch taken for missing values
+        self.value = value                # leaf value per node (0 for splits)
+        self.roots = roots                # global root id per tree
+        self.n_classes = n_classes
+        self.base_score = base_score
+        self.max_depth = max_depth
+        # trees x classes one-hot, so class margins are a single matmul
+        self.class_matrix = np.zeros((len(roots), n_classes), dtype=np.float32)
+        self.class_matrix[np.arange(len(roots)), tree_class] = 1.0
+
+    @classmethod
+    def from_booster(cls, booster):
+        return cls.from_model_dict(json.loads(booster.save_raw("json")))
+
+    @classmethod
+    def from_json(cls, path):
+        # XGBoost's native JSON model format; no xgboost import needed
+        with open(path, encoding="utf-8") as f:
+            return cls.from_model_dict(json.load(f))
+
+    @classmethod
+    def from_model_dict(cls, model_dict):
+        learner = model_dict["learner"]
+        n_classes = max(int(learner["learner_model_param"]["num_class"]), 1)
+        base_score = float(learner["learner_model_param"]["base_score"])
+        gbm = learner["gradient_booster"]
+        if gbm["name"] != "gbtree":
+            raise ValueError(f"Unsupported booster type: {gbm['name']}")
+        trees = gbm["model"]["trees"]
+        tree_class = np.asarray(gbm["model"]["tree_info"], dtype=np.int64)
+
+        feature, threshold, left, right, default_left, value, roots = [], [], [], [], [], [], []
+        max_depth = 0
+        offset = 0
+        for tree in trees:
+            if any(tree["split_type"]):
+                raise ValueError("Categorical splits are not supported by the compiled engine")
+
+            tree_left = np.asarray(tree["left_children"], dtype=np.int64)
+            tree_right = np.asarray(tree["right_children"], dtype=np.int64)
+            cond = np.asarray(tree["split_conditions"], dtype=np.float32)
+            is_leaf = tree_left == -1
+            ids = np.arange(len(tree_left), dtype=np.int64)
+
+            feature.append(np.where(is_leaf, 0, tree["split_indices"]))
+            threshold.append(np.where(is_leaf, np.float32(0), cond))
+            left.append(np.where(is_leaf, ids, tree_left) + offset)
+            right.append(np.where(is_leaf, ids, tree_right) + offset)
+            default_left.append(np.asarray(tree["default_left"], dtype=bool))
+            # XGBoost stores leaf weights in split_conditions
+            value.append(np.where(is_leaf, cond, np.float32(0)))
+            roots.append(offset)
+
+            max_depth = max(max_depth, _tree_depth(tree_left, tree_right))
+            offset += len(tree_left)
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int64),
+            threshold=np.concatenate(threshold).astype(np.float32),
+            left=np.concatenate(left),
+            right=np.concatenate(right),
+            default_left=np.concatenate(default_left),
+            value=np.concatenate(value).astype(np.float32),
+            roots=np.asarray(roots, dtype=np.int64),
+            tree_class=tree_class,
+            n_classes=n_classes,
+            base_score=base_score,
+            max_depth=max_depth,
+        )
+
+    def predict_leaf_values(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(x), self.default_left[node], x < self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node]
+
+    def predict_margin(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        # Row blocks keep the (rows x trees) node matrix small for large batches
+        margin = np.empty((len(X), self.n_classes), dtype=np.float32)
+        for start in range(0, len(X), BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            margin[start:start + BLOCK_ROWS] = self.predict_leaf_values(block) @ self.class_matrix
+        return margin + np.float32(self.base_score)
+
+    def predict_proba(self, X):
+        margin = self.predict_margin(X)
+        margin = margin - margin.max(axis=1, keepdims=True)
+        prob = np.exp(margin)
+        return prob / prob.sum(axis=1, keepdims=True)
+
+    def predict(self, X):
+        return self.predict_margin(X).argmax(axis=1)
+
+
+def _tree_depth(left, right):
+    depth, frontier = 0, [0]
+    while True:
+        frontier = [c for n in frontier if left[n] != -1 for c in (left[n], right[n])]
+        if not frontier:
+            return depth
+        depth += 1
+
+
+def compile_model(model):
+    # model: a fitted XGBClassifier
+    return CompiledEnsemble.from_booster(model.get_booster())
+
+
+# ----------------- Parity Check ------------------
+def check_parity(model, encoders, path="user_goal_dataset_3000.csv", atol=1e-5):
+    # Compares the compiled engine against model.predict_proba on a training-style CSV
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    feature_names = list(model.get_booster().feature_names)
+    for column in ("risk_profile", "goal"):
+        df[column] = encoders[column].transform(df[column])
+    X = df[feature_names]
+
+    # Exercise the missing-value branches as well
+    X_missing = X.head(200).astype(float).copy()
+    X_missing.iloc[::3, 0] = np.nan
+    X_missing.iloc[1::3, 2] = np.nan
+    X_missing.iloc[2::3, 5] = np.nan
+
+    compiled = compile_model(model)
+    report = {}
+    for name, frame in (("dataset", X), ("missing_values", X_missing)):
+        expected = model.predict_proba(frame)
+        actual = compiled.predict_proba(frame.to_numpy(dtype=np.float32))
+        report[name] = {
+            "rows": len(frame),
+            "max_abs_diff": float(np.abs(expected - actual).max()),
+            "argmax_mismatches": int((expected.argmax(axis=1) != actual.argmax(axis=1)).sum()),
+        }
+        report[name]["ok"] = report[name]["max_abs_diff"] <= atol and report[name]["argmax_mismatches"] == 0
+    return report
+
+
+if __name__ == "__main__":
+    from ml_investment_predictor import model, encoders
+
+    report = check_parity(model, encoders, *sys.argv[1:2])
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if all(r["ok"] for r in report.values()) else 1)